@@ -7,7 +7,11 @@ from luv.Token import TARGETS, ENEMIES
 from luv.util import print_board
 from copy import copy
 from copy import deepcopy
-from luv.Coordinate import Coordinate
+from luv.Coordinate import Coordinate, BOARD_COORDINATES
+import luv.bitboard as bitboard
+import luv.zobrist as zobrist
+import luv.evaluation as evaluation
+from luv.evaluation import EvaluationTerms
 import random
 import time
 
@@ -33,8 +37,14 @@ class Board:
 		# which side of team are we in  
 		self.team = team
 		self.isFullyExpand = False
-		# {child: (upper_action, lower_action), child2: (upper_action, lower_action)}
+		# {child: (upper_action, lower_action), child2: (upper_action, lower_action)}, actions are move codes
 		self.child = {}
+		# joint actions (moves.joint_action) of the children already expanded
+		self.tried = set()
+		# undo entries of the joint actions applied in place
+		self.undo_stack = []
+		# luv.evaluation.EvaluationTerms, created by the first evaluation and kept up to date by make and undo
+		self.terms = None
 		if not self.parent:
 			self.depth = 0
 		else:
@@ -66,13 +76,46 @@ class Board:
 		return "board: {uppers: " + self.uppers.toString() + ", lowers: " + self.lowers.toString() + ", self team: " + str(self.team) + ", depth: " + str(self.depth) + "}"
 
 	def __eq__(self, other):
-		return self.uppers == other.uppers and (self.lowers == other.lowers)
+		if not isinstance(other, Board):
+			return False
+		return self.key() == other.key() and self.uppers == other.uppers and (self.lowers == other.lowers)
 	
 	def __hash__(self):
-		#return hash(self.uppers.__hash__, self.lowers.__hash__)
-		return hash(self.uppers.__hash__) + hash(self.lowers.__hash__)
+		return self.key()
+
+	def key(self):
+		"""
+		Zobrist key of the position: token placements, remaining throws and side to move.
+		"""
+		key = self.uppers.key ^ self.lowers.key
+		# after Board.result only one side has moved, the other is still to move
+		if self.depth % 1:
+			key ^= zobrist.HALF_MOVE
+		return key
 	
+	def evaluation_terms(self):
+		"""
+		The incrementally updated evaluation terms of this board.
+		"""
+		if self.terms is None:
+			self.terms = EvaluationTerms(self)
+		return self.terms
+
 	def evaluation_score(self):
+		"""
+		Average distance of the upper tokens to their nearest target minus the same for the lower tokens,
+		read from the evaluation terms (see full_evaluation_score).
+		"""
+		score = self.evaluation_terms().distance_score(self)
+		if evaluation.CHECK_INCREMENTAL:
+			expected = self.full_evaluation_score()
+			assert score == expected, "incremental evaluation {} differs from {}".format(score, expected)
+		return score
+
+	def full_evaluation_score(self):
+		"""
+		evaluation_score computed from scratch over all the tokens.
+		"""
 		#return hash(self.uppers) + hash(self.lowers)
 		# average distance between each upper token and its nearest target
 		# need to deal with tokens that don't have a nearest and tokens that are targeting the same token
@@ -106,16 +149,15 @@ class Board:
 		This function is based on the 'def _turn_detect_end(self):' in the referee.game file.
 		To detect whether it is an end of the game.
 		"""
-		upper_tokens = [s for s in self.uppers.team]
-		lower_tokens = [s for s in self.lowers.team]
-		upper_typeset = set([s.tokenType for s in upper_tokens])
-		lower_typeset = set([s.tokenType for s in lower_tokens])
-		upper_inv = [s for s in upper_tokens if self.lowers.remaining_throws == 0 and not s.defeated(lower_tokens)]
-		lower_inv = [s for s in lower_tokens if self.uppers.remaining_throws == 0 and not s.defeated(upper_tokens)]
-		upper_notokens = self.uppers.remaining_throws == 0 and len(upper_tokens) == 0
-		lower_notokens = self.lowers.remaining_throws == 0 and len(lower_tokens) == 0
-		upper_onetoken = self.uppers.remaining_throws == 0 and len(upper_tokens) == 1
-		lower_onetoken = self.lowers.remaining_throws == 0 and len(lower_tokens) == 1
+		upper_count = len(self.uppers.team)
+		lower_count = len(self.lowers.team)
+		# a token is invincible if the opponent has no throws left and no token of the type that beats it
+		upper_inv = self.lowers.remaining_throws == 0 and self.uppers.bits.has_invincible(self.lowers.bits)
+		lower_inv = self.uppers.remaining_throws == 0 and self.lowers.bits.has_invincible(self.uppers.bits)
+		upper_notokens = self.uppers.remaining_throws == 0 and upper_count == 0
+		lower_notokens = self.lowers.remaining_throws == 0 and lower_count == 0
+		upper_onetoken = self.uppers.remaining_throws == 0 and upper_count == 1
+		lower_onetoken = self.lowers.remaining_throws == 0 and lower_count == 1
 
 		# condition 1
 		if upper_notokens and lower_notokens:
@@ -161,17 +203,16 @@ class Board:
 		Give an action from a team, result in a new child board.
 		Since it is just one side action, then the depth should increase by 0.5.
 		param:
-			action: Action
+			action: Action or move code
 			player: which player do this action
 		"""
-		childboard = deepcopy(self)
+		childboard = self.copy(self)
+		if not isinstance(action, int):
+			action = action.represent()
 		if player == Enums.Team.UPPER:
-			childboard.uppers.update(action.represent())
+			childboard.make(action, None)
 		else:
-			childboard.lowers.update(action.represent())
-		# if the action is not 
-		childboard.checkCollision([action.to_point])
-		childboard.parent = self
+			childboard.make(None, action)
 		childboard.depth = self.depth + 0.5
 	
 		return childboard
@@ -180,27 +221,80 @@ class Board:
 		"""
 		Accept the upper action and lower action, check collision and return the updated board.
 		parameters:
-		upper_action: a tuple representation of upper player's action
-		lower_action: a tuple representation of lower player's action
-		"""
-		newboard = Board(self.team, self)
-		newboard.uppers = deepcopy(self.uppers)
-		newboard.lowers = deepcopy(self.lowers)
-		newboard.uppers.update(upper_action)
-		newboard.lowers.update(lower_action)
-		_, _, (r1, q1) = upper_action
-		_, _, (r2, q2) = lower_action
-		
-		# if the upper and lower player move to the same position, then just need to check that position, otherwise need to check two risk hexes
-		if r1 == r2 and q1 == q2:
-			collision_risk_hexes = [Coordinate(r1, q1)]
-		else:
-			collision_risk_hexes = [Coordinate(r1, q1), Coordinate(r2,q2)]
-			# board needs to check collision
-		# within each team or between player and opponent
-		newboard.checkCollision(collision_risk_hexes)
+		upper_action: a tuple representation (or move code) of upper player's action
+		lower_action: a tuple representation (or move code) of lower player's action
+		"""
+		newboard = self.copy(self)
+		newboard.make(upper_action, lower_action)
+		newboard.depth = self.depth + 1
 		return newboard
 
+	def copy(self, parent):
+		"""
+		Copy the position into a new board with the given parent.
+		Search information (children, utility, undo stack) is not copied.
+		"""
+		newboard = Board(self.team, parent)
+		newboard.uppers = self.uppers.copy()
+		newboard.lowers = self.lowers.copy()
+		newboard.depth = self.depth
+		if self.terms is not None:
+			newboard.terms = self.terms.copy()
+		return newboard
+
+	def make(self, upper_action, lower_action):
+		"""
+		Play the actions (move codes or tuple representations) on this board in place and check collision.
+		Either action can be None if only one side moves.
+		Return the undo entry: (upper undo, lower undo, tokens destroyed by the collision).
+		"""
+		collision_risk_hexes = []
+		upper_undo = lower_undo = None
+		if upper_action:
+			if not isinstance(upper_action, int):
+				upper_action = self.uppers.encode(upper_action)
+			upper_undo = self.uppers.update(upper_action)
+			collision_risk_hexes.append(BOARD_COORDINATES[upper_action & 63])
+		if lower_action:
+			if not isinstance(lower_action, int):
+				lower_action = self.lowers.encode(lower_action)
+			lower_undo = self.lowers.update(lower_action)
+			collision_risk_hexes.append(BOARD_COORDINATES[lower_action & 63])
+		# within each team or between player and opponent
+		killed = self.checkCollision(collision_risk_hexes)
+		if self.terms is not None:
+			self.terms.record(self, upper_action, lower_action, killed)
+		return (upper_action, upper_undo, lower_action, lower_undo, killed)
+
+	def apply(self, upper_action, lower_action):
+		"""
+		Update this board in place with a joint action (move codes or tuple representations),
+		and remember how to undo it. With only one action (the other is None)
+		the depth increases by 0.5 like in result.
+		"""
+		state = None if self.terms is None else self.terms.state()
+		entry = self.make(upper_action, lower_action)
+		self.depth += 1 if upper_action and lower_action else 0.5
+		self.undo_stack.append(entry + (state,))
+
+	def undo(self):
+		"""
+		Take back the last apply.
+		"""
+		upper_action, upper_undo, lower_action, lower_undo, (upper_killed, lower_killed), state = self.undo_stack.pop()
+		self.uppers.restore(upper_killed)
+		self.lowers.restore(lower_killed)
+		if lower_action:
+			self.lowers.revert(lower_undo)
+		if upper_action:
+			self.uppers.revert(upper_undo)
+		self.depth -= 1 if upper_action and lower_action else 0.5
+		if state is not None:
+			self.terms.restore(state)
+		else:
+			# the terms were made after the apply, they can't be taken back
+			self.terms = None
+
 	def getActions(self,ttype, action_limit):
 		"""
 		Given teamType, board will get possible actions from the team.
@@ -209,14 +303,18 @@ class Board:
 		action_limit: an int that limits the number of actions returned
 		"""
 		if ttype == Enums.Team.UPPER:
-			opponent_tokens = self.lowers.team
-			actions = self.uppers.getLimitedActions(opponent_tokens, action_limit)
-			
+			team = self.uppers
 		else:
-			opponent_tokens = self.uppers.team
-			actions = self.lowers.getLimitedActions(opponent_tokens, action_limit)
-			
-		return actions
+			team = self.lowers
+		return [team.to_action(code) for code in self.getActionCodes(ttype, action_limit)]
+
+	def getActionCodes(self, ttype, action_limit):
+		"""
+		Same as getActions, but the actions are move codes (luv.moves).
+		"""
+		if ttype == Enums.Team.UPPER:
+			return self.uppers.getLimitedCodes(self.lowers, action_limit)
+		return self.lowers.getLimitedCodes(self.uppers, action_limit)
 
 	
 	def checkCollision(self, hexes):
@@ -224,48 +322,13 @@ class Board:
 		Check collision on the board when the board is updated.
 		parameters:
 		hexes: a list of hexes, of which collision may happen.
+		Return the destroyed (index, token) pairs of both teams, so they can be restored.
 		"""
-		destroyed_tokens = []
+		risk = 0
 		for position in hexes:
-			colliding_tokens = []
-
-			# collect for each hex, type of token and its number
-			symbols = []
-			# collect upper tokens on the hex
-			for token in self.uppers.team:
-				if token.position.distance(position) == 0:
-					colliding_tokens.append(token)
-					if token.tokenType not in symbols:
-						symbols.append(token.tokenType)
-			# collect lower tokens on the hex
-			for token in self.lowers.team:
-				if token.position.distance(position) == 0:
-					colliding_tokens.append(token)
-					if token.tokenType not in symbols:
-						symbols.append(token.tokenType)
-		
-			# if the hex is occupied by one or more tokens with each symbol, all of the tokens are defeated
-			if len(symbols) == TOTAL_SYMBOLS:
-				destroyed_tokens.extend(colliding_tokens)
-			# all the tokens are the same type
-			elif len(symbols) == 1:
-				pass
-		
-			# tokens in the hex contain two symbols
-			else: 
-				# symbol 0 wins
-				if TARGETS[symbols[0]]== symbols[1]:
-					filter_colliding = list(filter(lambda x: x.tokenType == symbols[1],colliding_tokens))
-					destroyed_tokens.extend(filter_colliding)
-				# symbol 1 wins
-				else: 
-					filter_colliding = list(filter(lambda x: x.tokenType == symbols[0],colliding_tokens))
-					destroyed_tokens.extend(filter_colliding)
-
-		# remove the destroyed tokens
-		for token in destroyed_tokens:
-			if token.team == Enums.Team.UPPER:
-				self.uppers.team.remove(token)
-			else:
-				self.lowers.team.remove(token)
-
+			risk |= 1 << position.index
+		# defeated hexes of every token type, for both teams at once
+		kills = bitboard.collisions(self.uppers.bits, self.lowers.bits, risk)
+		if not (kills[0] or kills[1] or kills[2]):
+			return ([], [])
+		return (self.uppers.remove_killed(kills), self.lowers.remove_killed(kills))
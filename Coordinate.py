@@ -1,50 +1,51 @@
 import luv.Enums as Enums
+from luv.geometry import HEXES, HEX_INDEX, DISTANCE, hex_distance
 
 BOARD_SIDE_LENGTH = 4
 
 class Coordinate:
+	"""
+	A point of the hex grid. Points on the board are flyweights: use get_coordinate
+	to get the shared instance of a hex instead of building a new one.
+	"""
+	__slots__ = ('x', 'y', 'index')
 	x: int
 	y: int
 	def __init__(self, x, y):
 		self.x = x
 		self.y = y
+		# geometry index of the hex, None if it is off the board
+		self.index = HEX_INDEX.get((x, y))
 
 	# def copy(self):
 	# 	return Coordinate(self.x, self.y)
 		
 	def __eq__(self,other):
+		if self is other:
+			return True
+		if other is None:
+			return False
 		return self.x == other.x and self.y == other.y
 
+	def __hash__(self):
+		if self.index is not None:
+			return self.index
+		return hash((self.x, self.y))
+
 	def distance(self, other):
 		"""
-		Reused code from part A
-		Return the number of steps between two points (manhattan distance on hexagonal grids)
-		https://stackoverflow.com/questions/5084801/manhattan-distance-between-tiles-in-a-hexagonal-grid/5085274#5085274
+		Return the number of steps between two points (manhattan distance on hexagonal grids),
+		read from the precomputed distance table when both points are on the board.
 		"""
-		#x_a, y_a = point_a
-		#x_b, y_b = point_b
-		#dx = x_a - x_b
-		#dy = y_a - y_b
-
-		dx = self.x - other.x
-		dy = self.y - other.y
-
-
-		# since don't have sign() in python, so if dx and dy is the same sign, then the multiply will be >0
-		if dx * dy > 0:
-		    return abs(dx + dy)
-		else:
-		    return max(abs(dx), abs(dy))
+		if self.index is not None and other.index is not None:
+			return DISTANCE[self.index][other.index]
+		return hex_distance((self.x, self.y), (other.x, other.y))
 
 	def isOnBoard(self):
 		"""
 		Returns true if the coordinate identifies a position on the hexagonal grid and false otherwise
 		"""
-		# the board dimension is the number of hexes along each side of the board offset by 1
-		xValid = self.x <= BOARD_SIDE_LENGTH and self.x >= -BOARD_SIDE_LENGTH
-		yValid = self.y <= BOARD_SIDE_LENGTH and self.y >= -BOARD_SIDE_LENGTH
-		sumValid = self.x + self.y <= BOARD_SIDE_LENGTH and self.x + self.y >= -BOARD_SIDE_LENGTH
-		return xValid and yValid and sumValid
+		return self.index is not None
 
 	def toTuple(self):
 		return (self.x, self.y)
@@ -52,3 +53,16 @@ class Coordinate:
 	def toString(self):
 		return "(" + str(self.x) + ", " + str(self.y) + ")"
 
+
+# one shared coordinate for every hex on the board, by geometry index
+BOARD_COORDINATES = [Coordinate(r, q) for (r, q) in HEXES]
+
+
+def get_coordinate(x, y):
+	"""
+	Return the shared coordinate of hex (x, y), or None if it is off the board.
+	"""
+	index = HEX_INDEX.get((x, y))
+	if index is None:
+		return None
+	return BOARD_COORDINATES[index]
@@ -1,8 +1,18 @@
 from luv.Board import Board
 import luv.Enums as Enums
 from luv.Action import Action
-from luv.gametheory import solve_game
+from luv.bitboard import TOKEN_TYPES
+from luv.matrixgame import solve_game, equilibrium
+from luv.moves import joint_action
+from luv.rollout import batch_rollout, RankedPolicy
+from luv.arena import NodeStore, NONE
+from luv.payoff import payoff_matrix
+import luv.evaluation as evaluation
+from luv.evaluation import evaluate_boards, distance_scores, material_scores, TOKEN_WEIGHT, THROW_WEIGHT
+from luv.transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
 from collections import defaultdict
+import multiprocessing
+import atexit
 import numpy as np
 import time
 import random
@@ -12,17 +22,35 @@ sys.setrecursionlimit(10000)
 WIN = 1
 LOSE = -1
 DRAW = 0
+# a won or lost game is worth this many times WIN in the alpha-beta search, more than any evaluation
+TERMINAL_WEIGHT = 100
+# tolerance on equilibrium values in SMAB
+EPSILON = 1e-9
 ALL_SYMBOLS = ['r', 'p', 's']
 EXPLORATION = 1/np.sqrt(2)
 EXPLOITATION = 0
+# selection rules of the decoupled SM_MCTS, and the exploration rate of Exp3
+UCB = "ucb"
+EXP3 = "exp3"
+EXP3_GAMMA = 0.2
+# seconds a root parallel search waits for a worker after the deadline, a later worker is left out
+WORKER_GRACE = 0.05
+# approximate bytes of one node of the SM_MCTS tree (the Board, its two Teams and the statistics),
+# measured with python -m luv.benchmark memory_bound
+NODE_BYTES = 5000
+DECOUPLED_NODE_BYTES = 7000
+# a search over its node budget prunes down to this share of the budget
+PRUNE_TO = 0.75
 
 class Strategy:
     board: Board
+    # evaluation of a batch of positions in array form (luv.evaluation), same as the strategy's own
+    batch_scores = staticmethod(distance_scores)
 
     def __init__(self, board):
         self.board = board
         self.history = defaultdict(int)
-        self.history[hash(board)] += 1
+        self.history[board.key()] += 1
 
     def actions(self):
         pass
@@ -31,10 +59,16 @@ class Strategy:
         """
         The general goal test for all stratygies.
         """
-        if self.history[hash(board)] >= 3:
+        if self.history[board.key()] >= 3:
             board.utility = DRAW
             return True
         return board.goal_test()
+
+    def evaluate_batch(self, boards):
+        """
+        Static evaluation of many boards in one call: array of scores for Upper.
+        """
+        return evaluate_boards(boards, self.batch_scores)
     
 class Random(Strategy):
     """
@@ -46,56 +80,193 @@ class Random(Strategy):
     def actions(self):
         # random is very fast so we can consider as many actions as we want
         action_limit = 1000
-        actions = self.board.getActions(self.board.team, action_limit)
+        actions = self.board.getActionCodes(self.board.team, action_limit)
         index = random.randint(0, len(actions)-1)
         action = actions[index]
         return action
 
 
+class SearchTimeout(Exception):
+    """
+    Raised inside the alpha-beta search when the deadline has passed.
+    """
+
+
 class AlphaBeta_cutoff_MinMax(Strategy):
     """
+    Iterative-deepening alpha-beta. Upper and Lower move in turn (Upper first from the root
+    when we are Upper), values are from Upper's point of view.
+    Every iteration searches one ply deeper than the previous one, up to the cut-off depth d,
+    and stops when the calculation time is up. The move played is the best move of the
+    deepest completed iteration.
+    Moves are ordered with the best line of the previous iteration first, then the killer
+    moves of the ply, then by the history heuristic (cut-offs caused by the move so far).
     board: board when strategy starts
-    d: cut-off depth
+    d: cut-off depth (in turns, as board.depth)
+    calculation_time: seconds the search may take, None to always search to d
+    source:
+    1. https://www.chessprogramming.org/Iterative_Deepening
+    2. https://www.chessprogramming.org/Killer_Heuristic, https://www.chessprogramming.org/History_Heuristic
     """
-    def __init__(self, board, d):
+    batch_scores = staticmethod(material_scores)
+
+    def __init__(self, board, d, calculation_time=None):
         super().__init__(board)
         self.d = d 
+        self.calculation_time = calculation_time
+        # the search plays moves on self.board in place, so remember where it started
+        self.root_depth = board.depth
+        # cut-off depth of the current iteration, and the deadline of the search
+        self.limit = d
+        self.deadline = None
+        # best line of the last completed iteration (move codes by ply), and the lines found at each ply
+        self.pv = []
+        self.pv_table = {}
+        self.follow_pv = False
+        # {ply: [killer move codes]}, and {move code: score} for Upper and Lower
+        self.killers = defaultdict(list)
+        self.history_scores = (defaultdict(int), defaultdict(int))
+        # nodes searched and nodes per second by the last call of actions, depth of the deepest completed iteration
+        self.nodes = 0
+        self.node_rate = 0
+        self.depth_reached = None
+        # optional luv.transposition.AlphaBetaTable, it can be kept from one search to the next
+        self.transpositions = None
 
-    def evaluation(self):
+    def evaluation(self, board):
         """
-        Calculate the evaluation score
+        Calculate the evaluation score of the leaf board: the token difference (by type)
+        and the throw difference, read from the board's incrementally updated terms.
+        """
+        score = board.evaluation_terms().material(board)
+        if evaluation.CHECK_INCREMENTAL:
+            expected = self.full_evaluation(board)
+            assert score == expected, "incremental evaluation {} differs from {}".format(score, expected)
+        return score
+
+    def full_evaluation(self, board):
+        """
+        evaluation computed from scratch over all the tokens.
         """
         # feature 1: throw difference
-        upper = self.board.uppers
-        lower = self.board.lowers
+        upper = board.uppers
+        lower = board.lowers
         diff_throw = upper.remaining_throws - lower.remaining_throws
-        # feature2: different token numbers
+        # feature2: different token numbers (the groups are keyed by TokenType)
         upper_group = upper.group_team()
         lower_group = lower.group_team()
-        diff_token = np.sum([len(upper_group[a])- len(lower_group[a]) for a in ALL_SYMBOLS])
-        self.board.utility = 0.7 * diff_token + 0.3 * diff_throw
-        return self.board.utility
+        diff_token = sum(len(upper_group[t]) - len(lower_group[t]) for t in TOKEN_TYPES)
+        return TOKEN_WEIGHT * diff_token + THROW_WEIGHT * diff_throw
 
     def cutoff_test(self, board):
-        if self.goal_test(board) or board.depth > self.d + self.board.depth:
-            board.utility = self.evaluation()
+        if self.goal_test(board):
+            # a finished game outweighs any evaluation
+            board.utility = TERMINAL_WEIGHT * board.utility
+            return True
+        if board.depth > self.limit + self.root_depth:
+            board.utility = self.evaluation(board)
             return True
         return False
 
+    def ply(self, board):
+        return int(round(2 * (board.depth - self.root_depth)))
+
+    def draft(self, board):
+        """
+        Plies still to search under board in the current iteration.
+        """
+        return int(round(2 * (self.limit + self.root_depth - board.depth))) + 1
+
+    def probe(self, board, alpha, beta):
+        """
+        Value of board from the transposition table if a deep enough search settles it, else None,
+        and the best move stored for board (0 if there is none).
+        """
+        if self.transpositions is None:
+            return None, 0
+        return self.transpositions.probe(board.key(), self.draft(board), alpha, beta)
+
+    def store(self, board, v, alpha, beta, best):
+        """
+        Record the value v searched with the window (alpha, beta) and the best move.
+        """
+        if self.transpositions is None or best is None:
+            return
+        if v <= alpha:
+            bound = UPPER_BOUND
+        elif v >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.transpositions.store(board.key(), self.draft(board), bound, v, best)
+
+    def visit_node(self):
+        """
+        Count a node, and stop the search if the deadline has passed.
+        """
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % 256 == 0 and time.time() > self.deadline:
+            raise SearchTimeout()
+
+    def order_moves(self, board, moves, ply, team, hash_move=0):
+        """
+        Best line of the previous iteration first (while the search is still on it),
+        then the best move from the transposition table, then the killer moves,
+        then the others by history score. Ties keep the ranking of getActionCodes.
+        """
+        scores = self.history_scores[0 if team == Enums.Team.UPPER else 1]
+        killers = self.killers[ply]
+        keys = {a: (a != hash_move, a not in killers, -scores[a]) for a in moves}
+        ordered = sorted(moves, key=keys.__getitem__)
+        if self.follow_pv:
+            self.follow_pv = False
+            if ply < len(self.pv) and self.pv[ply] in keys:
+                ordered.remove(self.pv[ply])
+                ordered.insert(0, self.pv[ply])
+                self.follow_pv = True
+        return ordered
+
+    def record_cutoff(self, board, a, ply, team):
+        """
+        Remember a move that caused a cut-off: as a killer of the ply, and in the history scores.
+        """
+        killers = self.killers[ply]
+        if a not in killers:
+            killers.insert(0, a)
+            del killers[2:]
+        remaining = self.limit + self.root_depth - board.depth
+        self.history_scores[0 if team == Enums.Team.UPPER else 1][a] += int(2 * remaining + 1) ** 2
+
     def min_val(self, board, alpha, beta):
             """
             When the player is LOWER side.
             Reference : https://github.com/aimacode/aima-python/blob/master/games.py
             """
-            if self.cutoff_test(board) and board.utility:
-                return -board.utility
+            self.visit_node()
+            ply = self.ply(board)
+            self.pv_table[ply] = []
+            if self.cutoff_test(board):
+                return board.utility
+            value, hash_move = self.probe(board, alpha, beta)
+            if value is not None:
+                return value
             
             v = np.inf
-            for a in board.getActions(Enums.Team.LOWER, 10):
-                v = min(v, self.max_val(board.result(a, Enums.Team.LOWER), alpha, beta))
+            best = None
+            window = (alpha, beta)
+            for a in self.order_moves(board, board.getActionCodes(Enums.Team.LOWER, 10), ply, Enums.Team.LOWER, hash_move):
+                board.apply(None, a)
+                child_value = self.max_val(board, alpha, beta)
+                board.undo()
+                if child_value < v:
+                    v = child_value
+                    best = a
+                    self.pv_table[ply] = [a] + self.pv_table.get(ply + 1, [])
                 if v <= alpha:
-                    return v
+                    self.record_cutoff(board, a, ply, Enums.Team.LOWER)
+                    break
                 beta = min(beta, v)
+            self.store(board, v, *window, best)
             return v
         
     def max_val(self, board, alpha, beta):
@@ -103,49 +274,109 @@ class AlphaBeta_cutoff_MinMax(Strategy):
             When the player is UPPER side.
             code reference : https://github.com/aimacode/aima-python/blob/master/games.py
             """
+            self.visit_node()
+            ply = self.ply(board)
+            self.pv_table[ply] = []
             if self.cutoff_test(board):
                 return board.utility
+            value, hash_move = self.probe(board, alpha, beta)
+            if value is not None:
+                return value
             v = -np.inf
-            for a in board.getActions(Enums.Team.UPPER, 10):
-                v = max(v, self.min_val(board.result(a, Enums.Team.UPPER), alpha, beta))
+            best = None
+            window = (alpha, beta)
+            for a in self.order_moves(board, board.getActionCodes(Enums.Team.UPPER, 10), ply, Enums.Team.UPPER, hash_move):
+                board.apply(a, None)
+                child_value = self.min_val(board, alpha, beta)
+                board.undo()
+                if child_value > v:
+                    v = child_value
+                    best = a
+                    self.pv_table[ply] = [a] + self.pv_table.get(ply + 1, [])
                 if v >= beta:
-                    return v
+                    self.record_cutoff(board, a, ply, Enums.Team.UPPER)
+                    break
                 alpha = max(v, alpha)
+            self.store(board, v, *window, best)
             return v
-        
-    def actions(self):
+
+    def search_root(self):
         """
-        Use minmax strategy to calculate the best move by searching
-        forward all the way to the terminal states.
-        :param board: current board
+        One iteration at the cut-off depth self.limit.
+        Return our best move and its value.
         """
-        # our team should decide which action to take
         board = self.board
-        player = self.board.team
+        player = board.team
         # alpha is the best for Upper along the path to state
         alpha = -np.inf
-
         # beta is the best for lower along the path to state
         beta = np.inf
-        
         best_action = None
         NUM_ACTIONS = 5
-        if player == Enums.Team.UPPER:
-            for a in board.getActions(player, NUM_ACTIONS):
-                v = self.min_val(board.result(a, Enums.Team.UPPER), alpha, beta)
-                if v > alpha:
-                    alpha = v
-                    best_action = a
-            return best_action
-        
-        if player == Enums.Team.LOWER:
-            for b in board.getActions(player, NUM_ACTIONS):
-                v = self.max_val(board.result(b, Enums.Team.LOWER), alpha, beta)
-                if v < beta:
-                    beta = v
-                    best_action = b
-            return best_action
-  
+        self.follow_pv = True
+        for a in self.order_moves(board, board.getActionCodes(player, NUM_ACTIONS), 0, player):
+            if player == Enums.Team.UPPER:
+                board.apply(a, None)
+                v = self.min_val(board, alpha, beta)
+            else:
+                board.apply(None, a)
+                v = self.max_val(board, alpha, beta)
+            board.undo()
+            if player == Enums.Team.UPPER and v > alpha:
+                alpha = v
+            elif player == Enums.Team.LOWER and v < beta:
+                beta = v
+            else:
+                continue
+            best_action = a
+            pv = [a] + self.pv_table.get(1, [])
+        # the line of the previous iteration is used for ordering until the iteration is done
+        if best_action is not None:
+            self.pv = pv
+        return best_action, alpha if player == Enums.Team.UPPER else beta
+
+    def actions(self):
+        """
+        Search with alpha-beta one ply deeper at a time, until the cut-off depth or the deadline.
+        :param board: current board
+        """
+        begin_time = time.time()
+        board = self.board
+        self.deadline = None if self.calculation_time is None else begin_time + self.calculation_time
+        self.nodes = 0
+        self.depth_reached = None
+        self.pv = []
+        self.killers = defaultdict(list)
+        self.history_scores = (defaultdict(int), defaultdict(int))
+        if self.transpositions is not None:
+            self.transpositions.reset_stats()
+        undo_depth = len(board.undo_stack)
+        # the leaves read the evaluation terms, make and undo keep them up to date from the root
+        board.evaluation_terms()
+        best_action = None
+        limit = 0
+        while limit <= self.d:
+            self.limit = limit
+            try:
+                action, value = self.search_root()
+            except SearchTimeout:
+                # the unfinished iteration is dropped, take back the moves it left on the board
+                while len(board.undo_stack) > undo_depth:
+                    board.undo()
+                break
+            if action is not None:
+                best_action = action
+                self.depth_reached = limit
+            # a won or lost game was found, searching deeper won't change it
+            if abs(value) >= TERMINAL_WEIGHT:
+                break
+            limit += 0.5
+        self.node_rate = self.nodes / max(time.time() - begin_time, 1e-9)
+        if best_action is None:
+            # not even the first iteration finished in time, fall back to the best ranked action
+            return board.getActionCodes(board.team, 1)[0]
+        return best_action
+
 class Equilibrium_payoff(Strategy):
     """
     Level 1: based on 1 more level payoff matrix and find out Nash equilibrium.
@@ -158,31 +389,196 @@ class Equilibrium_payoff(Strategy):
         """
         Return the payoff matrix (upper as row and lower as column)
         Payoff value is the evaluation value of upper.
+        The joint actions are played on arrays (luv.payoff), no board is built.
         """
-        payoff = []
-        for upper_ac in upper_actions:
-            payoff_row = []
-            for lower_ac in lower_actions:
-                newboard = board.update_board(upper_ac.represent(), lower_ac.represent())
-                payoff_row.append(newboard.evaluation_score())
-            payoff.append(payoff_row)
-        return payoff
+        return payoff_matrix(board, upper_actions, lower_actions)
 
     def actions(self):
         # Note: action limit should change as we get further into the game / further into the search
         # For now, action limit behaves like a constant. 
         action_limit = 15
-        upper_actions = self.board.getActions(Enums.Team.UPPER, action_limit)
-        lower_actions = self.board.getActions(Enums.Team.LOWER, action_limit)
+        upper_actions = self.board.getActionCodes(Enums.Team.UPPER, action_limit)
+        lower_actions = self.board.getActionCodes(Enums.Team.LOWER, action_limit)
         payoff_matrix = self.compute_payoff_matrix(self.board, upper_actions, lower_actions)
         if self.board.team == Enums.Team.UPPER:
             s, v = solve_game(payoff_matrix, True, True)
             action = np.random.choice(upper_actions, 1,  p= s)[0]
-            return action
+            return int(action)
         else:
             s,v  = solve_game(payoff_matrix, False, False)
             action = np.random.choice(lower_actions, 1, p = s)[0]
-            return action
+            return int(action)
+
+
+class SMAB(Strategy):
+    """
+    Simultaneous-move alpha-beta: at every node both sides pick their actions at the same time,
+    and the node value is the equilibrium value for Upper of the payoff matrix of its joint actions
+    (solved with luv.matrixgame), down to the cut-off depth where boards are scored with
+    evaluation_score like Equilibrium_payoff.
+    Only the cells that can change the equilibrium value are searched. Each node starts from
+    the restricted game of the best ranked action of each side, solves it, then looks for a
+    better reply of each side to the other's equilibrium strategy. Replies that improve on the
+    restricted value join the game, until neither side has one.
+    Every cell keeps a pessimistic and an optimistic bound (-/+ TERMINAL_WEIGHT until searched). A reply
+    to a pure strategy only has to be searched in the window where it would improve on the value,
+    and a node stops as soon as the bounds found put its value out of its window.
+    source:
+    1. Saffidine, Finnsson, Buro, Alpha-Beta Pruning for Games with Simultaneous Moves (2012)
+    2. Bosansky et al., Using Double-Oracle Method and Serialized Alpha-Beta Search for Pruning in Simultaneous Move Games (2013)
+    board: board when strategy starts
+    d: cut-off depth in turns (joint actions)
+    action_limit: actions of each side at every node
+    """
+    def __init__(self, board, d=2, action_limit=8):
+        super().__init__(board)
+        self.d = d
+        self.action_limit = action_limit
+        # moves are played on self.board in place
+        self.root_depth = board.depth
+        # nodes searched, and cells searched out of the cells of all the matrices of the nodes, in the last call of actions
+        self.nodes = 0
+        self.cells = 0
+        self.total_cells = 0
+
+    def evaluation(self, board):
+        return board.evaluation_score()
+
+    def leaf_value(self, board):
+        """
+        Value of a finished game or of a board at the cut-off depth, None for the other boards.
+        """
+        if self.goal_test(board):
+            # a finished game outweighs any evaluation
+            return TERMINAL_WEIGHT * board.utility
+        if board.depth >= self.root_depth + self.d:
+            return self.evaluation(board)
+        return None
+
+    def solve(self, matrix, warm_start=None):
+        """
+        Equilibrium of a payoff matrix (Upper maximises, rows): the strategies of both sides, the value
+        and the gap it is known within (0 if it is exact). SMAB doesn't prune the restricted game itself,
+        luv.matrixgame.equilibrium removes its dominated rows and columns before solving it.
+        warm_start: strategies to start from if the matrix is solved by iterations (luv.matrixgame.equilibrium)
+        """
+        return equilibrium(matrix, warm_start)
+
+    def cell(self, board, bounds, a, b, alpha, beta):
+        """
+        Value of the joint action (a, b), searched in the window (alpha, beta) unless its bounds
+        already settle it. bounds: (pessimistic, optimistic, actions of upper, actions of lower)
+        """
+        pessimistic, optimistic, upper_actions, lower_actions = bounds
+        if pessimistic[a, b] == optimistic[a, b] or optimistic[a, b] <= alpha:
+            return optimistic[a, b]
+        if pessimistic[a, b] >= beta:
+            return pessimistic[a, b]
+        self.cells += 1
+        board.apply(upper_actions[a], lower_actions[b])
+        v = self.search(board, alpha, beta)[0]
+        board.undo()
+        if v <= alpha:
+            optimistic[a, b] = min(optimistic[a, b], v)
+        elif v >= beta:
+            pessimistic[a, b] = max(pessimistic[a, b], v)
+        else:
+            pessimistic[a, b] = optimistic[a, b] = v
+        return v
+
+    def replies(self, board, bounds, strategy, value, upper):
+        """
+        Value of every action of a side against the equilibrium strategy of the other side
+        in the restricted game, bounded on the side that can't improve on value.
+        upper: True for the rows (Upper's actions), False for the columns
+        """
+        pessimistic = bounds[0]
+        n = pessimistic.shape[0 if upper else 1]
+        support = np.flatnonzero(strategy)
+        values = np.empty(n)
+        for k in range(n):
+            if len(support) == 1:
+                # against a pure strategy only a better value matters
+                window = (value, np.inf) if upper else (-np.inf, value)
+                cells = [(k, support[0]) if upper else (support[0], k)]
+            else:
+                window = (-np.inf, np.inf)
+                cells = [(k, j) if upper else (j, k) for j in support]
+            values[k] = sum(strategy[j] * self.cell(board, bounds, a, b, *window)
+                for j, (a, b) in zip(support, cells))
+        return values
+
+    def search(self, board, alpha, beta):
+        """
+        Value of board for Upper, fail-soft: a value at or below alpha is an upper bound,
+        at or above beta a lower bound, otherwise it is exact.
+        Return (value, upper actions, lower actions, x, y): the actions and the equilibrium
+        strategies found over them, empty at a leaf.
+        """
+        self.nodes += 1
+        value = self.leaf_value(board)
+        if value is not None:
+            return value, [], [], None, None
+        upper_actions = board.getActionCodes(Enums.Team.UPPER, self.action_limit)
+        lower_actions = board.getActionCodes(Enums.Team.LOWER, self.action_limit)
+        shape = (len(upper_actions), len(lower_actions))
+        self.total_cells += shape[0] * shape[1]
+        bounds = (np.full(shape, -float(TERMINAL_WEIGHT)), np.full(shape, float(TERMINAL_WEIGHT)), upper_actions, lower_actions)
+        # actions of the restricted game
+        rows = [0]
+        cols = [0]
+        warm_start = None
+        while True:
+            for a in rows:
+                for b in cols:
+                    self.cell(board, bounds, a, b, -np.inf, np.inf)
+            x, y, value, gap = self.solve(bounds[0][np.ix_(rows, cols)], warm_start)
+            full_x = np.zeros(shape[0])
+            full_x[rows] = x
+            full_y = np.zeros(shape[1])
+            full_y[cols] = y
+            row_values = self.replies(board, bounds, full_y, value, True)
+            col_values = self.replies(board, bounds, full_x, value, False)
+            # our equilibrium strategies guarantee these bounds in the whole game
+            upper_bound = row_values.max()
+            lower_bound = col_values.min()
+            if lower_bound >= beta:
+                return lower_bound, upper_actions, lower_actions, full_x, full_y
+            if upper_bound <= alpha:
+                return upper_bound, upper_actions, lower_actions, full_x, full_y
+            # a value found by iterations is only known within its gap
+            tolerance = max(EPSILON, gap)
+            # only actions not in the restricted game yet can join it
+            new_rows = row_values.copy()
+            new_rows[rows] = -np.inf
+            new_cols = col_values.copy()
+            new_cols[cols] = np.inf
+            improved = False
+            if new_rows.max() > value + tolerance:
+                rows.append(int(new_rows.argmax()))
+                improved = True
+            if new_cols.min() < value - tolerance:
+                cols.append(int(new_cols.argmin()))
+                improved = True
+            if not improved:
+                return value, upper_actions, lower_actions, full_x, full_y
+            # the next restricted game starts from this equilibrium, the new actions without weight
+            warm_start = (np.append(x, np.zeros(len(rows) - len(x))), np.append(y, np.zeros(len(cols) - len(y))))
+
+    def actions(self):
+        self.nodes = 0
+        self.cells = 0
+        self.total_cells = 0
+        # the leaves read the evaluation terms, make and undo keep them up to date from the root
+        self.board.evaluation_terms()
+        value, upper_actions, lower_actions, x, y = self.search(self.board, -np.inf, np.inf)
+        if x is None:
+            return self.board.getActionCodes(self.board.team, 1)[0]
+        if self.board.team == Enums.Team.UPPER:
+            action = np.random.choice(upper_actions, 1, p=x)[0]
+        else:
+            action = np.random.choice(lower_actions, 1, p=y)[0]
+        return int(action)
 
 
 class SM_MCTS(Strategy):
@@ -195,15 +591,45 @@ class SM_MCTS(Strategy):
     2. https://www.geeksforgeeks.org/ml-monte-carlo-tree-search-mcts/
 
     """
-    def __init__(self, board, calculation_time):
+    def __init__(self, board, calculation_time, workers=1, rollout_batch=1):
         super().__init__(board)
         # restrict calculation time
         self.calculation_time = calculation_time
+        # number of processes searching the root, this one included (root parallelisation)
+        self.workers = workers
+        # number of leaves selected before their rollouts are played together (luv.rollout)
+        self.rollout_batch = rollout_batch
+        if rollout_batch > 1:
+            self.rng = np.random.default_rng(random.getrandbits(32))
         # a dictionary to record the visit and wins count
         self.visit = defaultdict(int)
         self.wins = defaultdict(int)
+        # simulations run by all workers in the last call of actions, and the simulations per second
+        self.simulations = 0
+        self.simulation_rate = 0
+        # optional budget of simulations per call of actions (per worker), on top of the calculation time
+        self.max_simulations = None
+        # how leaves are played out (luv.rollout), and the plies played by the rollouts of the last call of actions
+        self.policy = RankedPolicy()
+        self.rollout_plies = 0
+        self.rollout_length = 0
+        # optional budget of nodes in the tree and of its approximate bytes,
+        # the least visited subtrees are pruned when it is exceeded
+        self.max_nodes = None
+        self.max_bytes = None
+        self.nodes = 1
+        # number of prunes so far and the nodes left by the last one
+        self.prunes = 0
+        self.pruned_to = None
+        # optional transposition table (luv.transposition), children in the same position share one node,
+        # the paths of the leaves of the current batch are then kept for backpropagate
+        self.transpositions = None
+        self.paths = []
+        # nodes added to the tree by the last call of actions, per simulation
+        self.new_nodes = 0
+        self.nodes_per_simulation = 0
 
-    def ucb(self, childboard, exploitation):
+    def ucb(self, childboard, exploitation, parent=None):
         """
         UCB formula (Upper confidence bound) is based on 
         https://www.researchgate.net/publication/235985858_A_Survey_of_Monte_Carlo_Tree_Search_Methods
@@ -220,6 +646,8 @@ class SM_MCTS(Strategy):
             otherwise just use the exploitation part to find best child
         param:
         board: childboard
+        parent: the board the child is reached from, by default childboard.parent
+        (with transpositions a child may have several parents)
 
         """
         if self.visit[childboard] == 0:
@@ -228,55 +656,160 @@ class SM_MCTS(Strategy):
             confidence = EXPLOITATION
         else:
             confidence = EXPLORATION
-        return self.wins[childboard]/self.visit[childboard] + confidence * np.sqrt(2*np.log(self.visit[childboard.parent])/self.visit[childboard])
+        if parent is None:
+            parent = childboard.parent
+        return self.wins[childboard]/self.visit[childboard] + confidence * np.sqrt(2*np.log(self.visit[parent])/self.visit[childboard])
     
     def actions(self):
         """
-        Main part for the Monte Carlo Tree Search, 
+        Main part for the Monte Carlo Tree Search.
+        With more than one worker, the other workers grow independent trees from
+        the same root under the same deadline, and the visit and win counts of
+        the root children are merged by joint action before picking the move.
+        A worker whose result isn't back shortly after the deadline is left out.
         """
         begin_time = time.time()
-        while time.time() - begin_time < self.calculation_time:
-            leaf = self.selection(self.board)
-            simulation_result = self.simulation(leaf)
-            self.backpropagate(leaf, simulation_result)
-        # print(time.time()- begin_time)
-        best_child = self.best_child(self.board, True)
+        deadline = begin_time + self.calculation_time
+        self.rollout_plies = 0
+        self.new_nodes = 0
+        if self.transpositions is not None:
+            self.transpositions.reset_stats()
+        pending = []
+        if self.workers > 1:
+            root = self.board.copy(None)
+            pending = [worker_pool(self.workers - 1).apply_async(root_search, (self.spawn(root), random.getrandbits(32), deadline))
+                for _ in range(self.workers - 1)]
+        simulations = self.search(deadline)
+        stats = self.root_stats()
+        for result in pending:
+            try:
+                worker_stats, worker_simulations, worker_plies = result.get(max(deadline - time.time(), 0) + WORKER_GRACE)
+            except multiprocessing.TimeoutError:
+                continue
+            simulations += worker_simulations
+            self.rollout_plies += worker_plies
+            for joint, (visit, wins) in worker_stats.items():
+                total = stats.setdefault(joint, [0, 0])
+                total[0] += visit
+                total[1] += wins
+        self.simulations = simulations
+        self.simulation_rate = simulations / (time.time() - begin_time)
+        self.rollout_length = self.rollout_plies / max(simulations, 1)
+        self.nodes_per_simulation = self.new_nodes / max(simulations, 1)
+
+        if not stats:
+            # no simulation finished in time, fall back to the best ranked action
+            return self.board.getActionCodes(self.board.team, 1)[0]
+        return self.choose_action(stats)
+
+    def search(self, deadline):
+        """
+        Select, expand, simulate and backpropagate until the deadline (a time.time() value).
+        Return the number of simulations run.
+        """
+        simulations = 0
+        while self.within_budget(deadline, simulations):
+            leaves = [self.selection(self.board) for _ in range(self.rollout_batch)]
+            for leaf, simulation_result in zip(leaves, self.simulate_batch(leaves)):
+                self.backpropagate(leaf, simulation_result)
+            simulations += len(leaves)
+            self.check_budget()
+        return simulations
+
+    def within_budget(self, deadline, simulations):
+        """
+        Whether the search may run another simulation.
+        """
+        if self.max_simulations is not None and simulations >= self.max_simulations:
+            return False
+        return time.time() < deadline
+
+    def spawn(self, board):
+        """
+        A new search with the same settings from board, sharing the repetition history
+        (used by the workers of the root parallel search).
+        """
+        return self.share_settings(SM_MCTS(board, self.calculation_time, 1, self.rollout_batch))
+
+    def share_settings(self, mcts):
+        """
+        Give a spawned search our repetition history, simulation budget, rollout policy,
+        node budget and a transposition table of the same size.
+        """
+        mcts.history = self.history
+        mcts.max_simulations = self.max_simulations
+        mcts.policy = self.policy
+        mcts.max_nodes = self.max_nodes
+        mcts.max_bytes = self.max_bytes
+        if self.transpositions is not None:
+            mcts.transpositions = TranspositionTable(self.transpositions.capacity)
+        return mcts
+
+    def root_stats(self):
+        """
+        Visit and win counts of the root children: {joint action: [visit, wins]},
+        in the order the children were expanded.
+        """
+        return {joint_action(*action): [self.visit[childboard], self.wins[childboard]]
+            for childboard, action in self.board.child.items()}
+
+    def choose_action(self, stats):
+        """
+        Our action of the joint action with the best exploitation value (same as
+        best_child with confidence True), the first one on ties. Unvisited actions come first.
+        stats: root_stats, possibly merged from several workers
+        """
+        best_value = -np.inf
+        best_joint = None
+        for joint, (visit, wins) in stats.items():
+            value = wins/visit if visit else np.inf
+            if value > best_value:
+                best_value = value
+                best_joint = joint
+        # joint actions are (upper_action << 16 | lower_action)
         if self.board.team == Enums.Team.UPPER:
-            # since the board child is in the form of (child board: (upper_action, lower_action))
-            # so best child will give the combination of actions (upper_action, lower_action)
-            # if our side is upper, use index 0
-            return self.board.child[best_child][0]
+            return best_joint >> 16
         else:
-            # if our side in lower, use index 1 
-            return self.board.child[best_child][1]
-    
+            return best_joint & 0xFFFF
+
     def selection(self, board):
         """
         If the node is not the terminal,
         ---- if not fully expand, expand 
         ---- if expands fully, return the best child (use UCB)
+        With transpositions the walk stops if it comes back to a position of the path,
+        and the path is kept for backpropagate.
         """
         node = board
+        path = [node]
         while not self.goal_test(node):
-            if node.isFullyExpand == False:
-                return self.expansion(node)
+            expanded = node.isFullyExpand == False
+            if expanded:
+                child = self.expansion(node)
             else:
-                node = self.best_child(node, False)
+                child = self.best_child(node, False)
+            if self.transpositions is not None and child in path:
+                break
+            node = child
+            path.append(node)
+            if expanded:
+                break
+        if self.transpositions is not None:
+            self.paths.append(path)
         return node
 
     def expansion(self,board):
         """
         Expand one childboard for the current board each time.
         """
-        tries_action = board.child.values()
         NUM_ACTIONS = 10
         # generate actions
-        lower_actions = board.getActions(Enums.Team.LOWER, NUM_ACTIONS)
-        upper_actions = board.getActions(Enums.Team.UPPER, NUM_ACTIONS)
+        lower_actions = board.getActionCodes(Enums.Team.LOWER, NUM_ACTIONS)
+        upper_actions = board.getActionCodes(Enums.Team.UPPER, NUM_ACTIONS)
         
         # combination of actions
         comb = list(zip(upper_actions, lower_actions))
-        remaining = [x for x in comb if x not in tries_action]
+        remaining = [x for x in comb if joint_action(*x) not in board.tried]
 
         if len(remaining) == 1:
             action = remaining[0]
@@ -286,36 +819,58 @@ class SM_MCTS(Strategy):
             action = remaining[random.randint(0, len(remaining) - 1)]
         else:
             action = comb[random.randint(0, len(comb) - 1)]
-        childboard = board.update_board(action[0].represent(), action[1].represent())
+        childboard = board.update_board(action[0], action[1])
+        if self.transpositions is not None:
+            shared = self.transpositions.lookup(childboard)
+            if shared is not childboard:
+                # the position is already in the tree, link to its node and keep its statistics
+                board.child[shared] = action
+                board.tried.add(joint_action(*action))
+                return shared
+        if childboard not in board.child:
+            self.nodes += 1
+            self.new_nodes += 1
         board.child[childboard] = action
-        # visit dictionary records how many time we visit the child board during simulation
-        self.visit[childboard] = 0
-
-        # wins dictionary records during simulation how many times we win
-        self.wins[childboard] = 0
+        board.tried.add(joint_action(*action))
+        # visit dictionary records how many time we visit the child board during simulation,
+        # wins dictionary records during simulation how many times we win.
+        # Both are keyed by position, keep the counts of an equal position already in the tree
+        self.visit.setdefault(childboard, 0)
+        self.wins.setdefault(childboard, 0)
         return childboard
     
     def simulation(self, board):
         """
-        Simulation part. Randomly rollout.
+        Simulation part. Rollout with the rollout policy (by default the random pick among the best ranked actions).
+        The rollout is played on the board in place and taken back afterwards.
         """
-        node = board
-        NUM_ACTIONS = 5
-        while True:
-            if self.goal_test(node):
-                if node.team == Enums.Team.UPPER:
-                    return node.utility
-                return -node.utility
-            lower_actions = node.getActions(Enums.Team.LOWER, NUM_ACTIONS)
-            upper_actions = node.getActions(Enums.Team.UPPER, NUM_ACTIONS)
-            # combination of actions
-            comb = list(zip(upper_actions, lower_actions))
-
-            # get random rollout
-            action = comb[random.randint(0, len(comb) - 1)]
+        result, plies = self.policy.rollout(board, self.goal_test)
+        self.rollout_plies += plies
+        if board.team == Enums.Team.UPPER:
+            return result
+        else:
+            return -result
 
-            node = node.update_board(action[0].represent(), action[1].represent())
-        return 
+    def simulate_batch(self, leaves):
+        """
+        Simulation results of several leaves. A single leaf is simulated as usual,
+        otherwise the uniformly random rollouts of all the leaves are played at once with luv.rollout.
+        """
+        if len(leaves) == 1:
+            return [self.simulation(leaves[0])]
+        results = [None] * len(leaves)
+        pending = []
+        for k, leaf in enumerate(leaves):
+            if self.goal_test(leaf):
+                results[k] = leaf.utility if leaf.team == Enums.Team.UPPER else -leaf.utility
+            else:
+                pending.append(k)
+        if pending:
+            utility, plies = batch_rollout([leaves[k] for k in pending], self.rng)
+            self.rollout_plies += int(plies.sum())
+            for k, result in zip(pending, utility.tolist()):
+                results[k] = result if leaves[k].team == Enums.Team.UPPER else -result
+        return results
 
     def best_child(self, board, confidence):
         """
@@ -327,7 +882,7 @@ class SM_MCTS(Strategy):
         best_child = []
 
         for childboard, action in board.child.items():
-            ucb = self.ucb(childboard, confidence)
+            ucb = self.ucb(childboard, confidence, board)
             if ucb > best_value:
                 best_value = ucb
                 best_child = [childboard]
@@ -337,9 +892,9 @@ class SM_MCTS(Strategy):
         # in case of no best child, return the best action
         if not best_child:
             if board.team == Enums.Team.UPPER:
-                return board.uppers.getLimitedActions(board.lowers.team, 1)
+                return board.uppers.getLimitedCodes(board.lowers, 1)
             else:
-                return board.lowers.getLimitedActions(board.uppers.team, 1)
+                return board.lowers.getLimitedCodes(board.uppers, 1)
         # if there is many best child, return the first 1
         # otherwise, return the only child in best_child
         return  best_child[0]
@@ -349,27 +904,538 @@ class SM_MCTS(Strategy):
         After each simulation, propagate the visit and win's result back to root.
         board: the leaf node which has a result
         result: win/lose/draw
+        With transpositions the path kept by selection is followed instead of the parents.
         """
+        if self.transpositions is not None:
+            for node in self.paths.pop(0):
+                self.visit[node] += 1
+                self.wins[node] += 1 if result == WIN else -1
+            return
         node = board
-        while not node:
+        while node is not None:
             self.visit[node] += 1
             if result == WIN:
                 self.wins[node] += 1
             else:
                 # wanna penalise the move if results in draw or lose
                 self.wins[node] -= 1
+            # the root may still point at the previous game boards, stop there
+            if node is self.board:
+                break
             node = node.parent
         return 
-    
 
-            
+    def advance(self, upper_action, lower_action):
+        """
+        Move the root down to the child reached by the joint action actually played,
+        so its subtree and statistics are reused for the next search.
+        The rest of the tree is released.
+        upper_action, lower_action: tuple representations or move codes
+        Return False if the search never expanded that child.
+        """
+        root = self.board
+        newboard = root.update_board(upper_action, lower_action)
+        # children are keyed by position, a different joint action reaching the same position is as good
+        new_root = None
+        for child in root.child:
+            if child == newboard:
+                new_root = child
+                break
+        if new_root is None:
+            return False
 
+        new_root.parent = None
+        self.board = new_root
+        self.history[new_root.key()] += 1
+        nodes = self.subtree(new_root)
+        self.keep_statistics(nodes)
+        self.nodes = len(nodes)
+        return True
 
-        
+    def child_nodes(self, board):
+        return board.child
 
+    def subtree(self, board):
+        """
+        All the nodes of the tree under board, board included, parents before children.
+        """
+        nodes = []
+        seen = set()
+        stack = [board]
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            nodes.append(node)
+            stack.extend(self.child_nodes(node))
+        return nodes
 
-        
+    def node_count(self):
+        return self.nodes
 
-    
+    def node_bytes(self):
+        return NODE_BYTES
+
+    def approximate_bytes(self):
+        return self.node_count() * self.node_bytes()
+
+    def node_budget(self):
+        """
+        Most nodes allowed by max_nodes and max_bytes, None if there is no budget.
+        """
+        budget = self.max_nodes
+        if self.max_bytes is not None:
+            by_bytes = self.max_bytes // self.node_bytes()
+            budget = by_bytes if budget is None else min(budget, by_bytes)
+        return budget
+
+    def check_budget(self):
+        """
+        Prune the tree if it has grown over the node budget.
+        """
+        budget = self.node_budget()
+        if budget is not None and self.node_count() > budget:
+            self.prune(int(budget * PRUNE_TO))
+            self.prunes += 1
+            self.pruned_to = self.node_count()
+
+    def node_visits(self, board):
+        return self.visit[board]
+
+    def prune(self, target):
+        """
+        Bring the tree down to target nodes: the least visited subtrees are cut off,
+        their roots are kept as leaves with their statistics and can be expanded again later.
+        A subtree that would take the tree well below target is passed over while a smaller one does.
+        """
+        nodes = self.subtree(self.board)
+        size = {}
+        parent = {}
+        for node in reversed(nodes):
+            size[id(node)] = 1
+            for child in self.child_nodes(node):
+                size[id(node)] += size[id(child)]
+                parent[id(child)] = node
+        count = len(nodes)
+        candidates = [node for node in nodes if node is not self.board and self.child_nodes(node)]
+        candidates.sort(key=self.node_visits)
+        collapsed = set()
+        # first only the subtrees that don't take the tree below target, then any if it is still over it
+        for exact in (True, False):
+            for node in candidates:
+                if count <= target:
+                    break
+                if id(node) in collapsed:
+                    continue
+                ancestors = []
+                above = parent.get(id(node))
+                while above is not None and id(above) not in collapsed:
+                    ancestors.append(above)
+                    above = parent.get(id(above))
+                # under a subtree already cut off
+                if above is not None:
+                    continue
+                removed = size[id(node)] - 1
+                if exact and count - removed < target:
+                    continue
+                self.collapse(node)
+                collapsed.add(id(node))
+                count -= removed
+                # the sizes above only count the nodes still in the tree
+                for above in ancestors:
+                    size[id(above)] -= removed
+        nodes = self.subtree(self.board)
+        self.keep_statistics(nodes)
+        self.nodes = len(nodes)
+
+    def collapse(self, board):
+        """
+        Drop the children of board, it becomes a leaf again.
+        """
+        board.child = {}
+        board.tried = set()
+        board.isFullyExpand = False
+
+    def keep_statistics(self, nodes):
+        """
+        Only keep the statistics of the given nodes.
+        """
+        visit = defaultdict(int)
+        wins = defaultdict(int)
+        for node in nodes:
+            visit[node] = self.visit[node]
+            wins[node] = self.wins[node]
+        self.visit = visit
+        self.wins = wins
+        if self.transpositions is not None:
+            self.transpositions.keep(nodes)
+            # a shared node may still point at a parent that was dropped
+            kept = {id(node) for node in nodes}
+            for node in nodes:
+                if id(node.parent) not in kept:
+                    node.parent = None
+
+
+class Arena_SM_MCTS(SM_MCTS):
+    """
+    SM_MCTS on an arena node store (luv.arena) instead of a Board per node.
+    Nodes only keep their statistics and the joint action leading to them: the position
+    of a node is rebuilt by applying the joint actions from the root on self.board in
+    place, and taken back once the simulation is done. Selection and backpropagation
+    work on node indexes.
+    """
+    def __init__(self, board, calculation_time, workers=1, rollout_batch=1):
+        super().__init__(board, calculation_time, workers, rollout_batch)
+        self.tree = NodeStore()
+
+    def spawn(self, board):
+        return self.share_settings(Arena_SM_MCTS(board, self.calculation_time, 1, self.rollout_batch))
+
+    def search(self, deadline):
+        simulations = 0
+        while self.within_budget(deadline, simulations):
+            paths = []
+            leaves = []
+            for _ in range(self.rollout_batch):
+                paths.append(self.selection(self.board))
+                if self.rollout_batch > 1:
+                    # the leaves of a batch are played out together, each needs its own board
+                    leaves.append(self.board.copy(None))
+                    self.take_back(paths[-1])
+                else:
+                    leaves.append(self.board)
+            results = self.simulate_batch(leaves)
+            if self.rollout_batch == 1:
+                self.take_back(paths[0])
+            for path, simulation_result in zip(paths, results):
+                self.backpropagate(path, simulation_result)
+            simulations += len(paths)
+            self.check_budget()
+        return simulations
+
+    def play(self, board, node):
+        """
+        Apply the joint action leading to node on board.
+        """
+        joint = int(self.tree.action[node])
+        board.apply(joint >> 16, joint & 0xFFFF)
+
+    def take_back(self, path):
+        """
+        Undo the joint actions of the path (node indexes from the root) on self.board.
+        """
+        for _ in range(len(path) - 1):
+            self.board.undo()
+
+    def expansion(self, node, board):
+        """
+        Allocate all the children of node at once, one per pair of ranked actions (as in SM_MCTS.expansion).
+        """
+        NUM_ACTIONS = 10
+        lower_actions = board.getActionCodes(Enums.Team.LOWER, NUM_ACTIONS)
+        upper_actions = board.getActionCodes(Enums.Team.UPPER, NUM_ACTIONS)
+        joints = list(dict.fromkeys(joint_action(*x) for x in zip(upper_actions, lower_actions)))
+        self.tree.expand(node, joints)
+        self.new_nodes += len(joints)
+
+    def selection(self, board):
+        """
+        Walk down from the root playing the joint actions on board. The first unvisited
+        child met (picked at random) is the leaf, nodes are expanded when first walked through.
+        Return the path of node indexes, board is left in the position of the leaf.
+        """
+        tree = self.tree
+        node = 0
+        path = [0]
+        while not self.goal_test(board):
+            if tree.first_child[node] == NONE:
+                self.expansion(node, board)
+            block = tree.children(node)
+            visit = tree.visit[block]
+            unvisited = np.flatnonzero(visit == 0)
+            if len(unvisited):
+                node = block.start + int(unvisited[random.randint(0, len(unvisited) - 1)])
+                self.play(board, node)
+                path.append(node)
+                break
+            ucb = tree.value[block] / visit + EXPLORATION * np.sqrt(2 * np.log(tree.visit[node]) / visit)
+            node = block.start + int(ucb.argmax())
+            self.play(board, node)
+            path.append(node)
+        return path
 
-        
\ No newline at end of file
+    def backpropagate(self, path, result):
+        # penalise draws like SM_MCTS.backpropagate
+        self.tree.backpropagate(path, 1 if result == WIN else -1)
+
+    def root_stats(self):
+        tree = self.tree
+        if tree.first_child[0] == NONE:
+            return {}
+        block = tree.children(0)
+        return {int(joint): [int(visit), float(value)]
+            for joint, visit, value in zip(tree.action[block], tree.visit[block], tree.value[block])}
+
+    def advance(self, upper_action, lower_action):
+        if not isinstance(upper_action, int):
+            upper_action = self.board.uppers.encode(upper_action)
+        if not isinstance(lower_action, int):
+            lower_action = self.board.lowers.encode(lower_action)
+        node = self.tree.find_child(0, joint_action(upper_action, lower_action))
+        if node == NONE:
+            return False
+        self.tree.reroot(node)
+        self.board = self.board.update_board(upper_action, lower_action)
+        self.board.parent = None
+        self.history[self.board.key()] += 1
+        return True
+
+    def node_count(self):
+        return len(self.tree)
+
+    def node_bytes(self):
+        return self.tree.node_bytes()
+
+    def prune(self, target):
+        """
+        Same as SM_MCTS.prune: the least visited nodes lose their children
+        until about target nodes are left, then the store is compacted.
+        """
+        tree = self.tree
+        n = len(tree)
+        # children are always allocated after their parent, so sizes add up from the end
+        size = np.ones(n, dtype=np.int64)
+        parent = tree.parent[:n]
+        for i in range(n - 1, 0, -1):
+            size[parent[i]] += size[i]
+        candidates = np.flatnonzero(tree.first_child[:n] != NONE)
+        candidates = candidates[candidates != 0]
+        candidates = candidates[np.argsort(tree.visit[candidates], kind="stable")].tolist()
+        size = size.tolist()
+        parent = parent.tolist()
+        count = n
+        collapsed = set()
+        for exact in (True, False):
+            for node in candidates:
+                if count <= target:
+                    break
+                if node in collapsed:
+                    continue
+                ancestors = []
+                above = parent[node]
+                while above != NONE and above not in collapsed:
+                    ancestors.append(above)
+                    above = parent[above]
+                if above != NONE:
+                    continue
+                removed = size[node] - 1
+                if exact and count - removed < target:
+                    continue
+                tree.first_child[node] = NONE
+                tree.num_children[node] = 0
+                collapsed.add(node)
+                count -= removed
+                for above in ancestors:
+                    size[above] -= removed
+        tree.reroot(0)
+
+
+class SideStats:
+    """
+    Statistics of one side's actions at one node of the decoupled SM_MCTS.
+    Rewards are scaled to [0, 1].
+    """
+    def __init__(self, actions):
+        self.actions = actions
+        self.visit = [0] * len(actions)
+        self.reward = [0.0] * len(actions)
+        # Exp3: importance weighted cumulative rewards
+        self.weight = [0.0] * len(actions)
+
+
+class Decoupled_SM_MCTS(SM_MCTS):
+    """
+    SM_MCTS with decoupled selection: at every node each side keeps the visit and
+    reward statistics of its own actions, and picks its action independently of the
+    other side with UCB or Exp3. Any of the joint actions can be expanded, while the
+    statistics only grow with the number of actions of each side.
+    The move played comes from our own action statistics at the root: the most visited
+    action, or an action drawn in proportion to the visits if mixed.
+    source:
+    1. Lanctot et al., Monte Carlo Tree Search in Simultaneous Move Games with Applications to Goofspiel (2013)
+    2. https://www.researchgate.net/publication/235985858_A_Survey_of_Monte_Carlo_Tree_Search_Methods
+    Page 17, section 4.5 (Exp3)
+    """
+    def __init__(self, board, calculation_time, workers=1, rollout_batch=1, rule=UCB, mixed=False):
+        super().__init__(board, calculation_time, workers, rollout_batch)
+        self.rule = rule
+        self.mixed = mixed
+        # nodes are told apart by identity, not by position, so transpositions
+        # can't make the tree loop back on itself
+        # {id(board): [upper SideStats, lower SideStats]}
+        self.stats = {}
+        # {id(board): {joint action: child board}}
+        self.children = {}
+        # nodes on the path to each leaf of the current batch with the actions picked
+        # and their probabilities: [(board, a, b, p, q)]
+        self.paths = []
+
+    def spawn(self, board):
+        return self.share_settings(Decoupled_SM_MCTS(board, self.calculation_time, 1, self.rollout_batch, self.rule, self.mixed))
+
+    def add_node(self, board):
+        """
+        Add board to the tree, with the actions both sides may pick from it.
+        """
+        NUM_ACTIONS = 10
+        self.stats[id(board)] = [SideStats(board.getActionCodes(Enums.Team.UPPER, NUM_ACTIONS)),
+            SideStats(board.getActionCodes(Enums.Team.LOWER, NUM_ACTIONS))]
+        self.children[id(board)] = {}
+
+    def select_action(self, side):
+        """
+        (index of the action picked by one side, probability it had to be picked),
+        the probability is 1 with UCB.
+        """
+        if self.rule == EXP3:
+            k = len(side.actions)
+            eta = EXP3_GAMMA / k
+            top = max(side.weight)
+            exps = [np.exp(eta * (w - top)) for w in side.weight]
+            total = sum(exps)
+            prob = [(1 - EXP3_GAMMA) * e / total + EXP3_GAMMA / k for e in exps]
+            a = random.choices(range(k), prob)[0]
+            return a, prob[a]
+        n = sum(side.visit)
+        best_value = -np.inf
+        best = 0
+        for a, visit in enumerate(side.visit):
+            if visit == 0:
+                return a, 1
+            value = side.reward[a] / visit + EXPLORATION * np.sqrt(2 * np.log(n) / visit)
+            if value > best_value:
+                best_value = value
+                best = a
+        return best, 1
+
+    def selection(self, board):
+        """
+        Walk down with both sides picking their actions, and add the first node
+        not in the tree yet. The path is kept for backpropagate.
+        """
+        node = board
+        path = []
+        if id(node) not in self.stats:
+            self.add_node(node)
+        while not self.goal_test(node):
+            upper, lower = self.stats[id(node)]
+            a, p = self.select_action(upper)
+            b, q = self.select_action(lower)
+            # the probabilities of the node's next selection differ, Exp3 needs these ones
+            path.append((node, a, b, p, q))
+            joint = joint_action(upper.actions[a], lower.actions[b])
+            child = self.children[id(node)].get(joint)
+            if child is None:
+                child = node.update_board(upper.actions[a], lower.actions[b])
+                node.child[child] = (upper.actions[a], lower.actions[b])
+                self.children[id(node)][joint] = child
+                self.add_node(child)
+                self.nodes += 1
+                self.new_nodes += 1
+                node = child
+                break
+            node = child
+        self.paths.append(path)
+        return node
+
+    def backpropagate(self, board, result):
+        """
+        Update the action statistics of both sides along the path of the oldest leaf
+        (leaves are backpropagated in the order they were selected).
+        result: win/lose/draw for our side
+        """
+        path = self.paths.pop(0)
+        if self.board.team == Enums.Team.LOWER:
+            result = -result
+        # rewards of upper and lower in [0, 1]
+        rewards = ((result + 1) / 2, (1 - result) / 2)
+        for node, a, b, p, q in path:
+            for side, action, prob, reward in zip(self.stats[id(node)], (a, b), (p, q), rewards):
+                side.visit[action] += 1
+                side.reward[action] += reward
+                side.weight[action] += reward / prob
+
+    def root_stats(self):
+        """
+        Visit and reward counts of our actions at the root: {action: [visit, reward]}.
+        """
+        if id(self.board) not in self.stats:
+            return {}
+        side = self.stats[id(self.board)][0 if self.board.team == Enums.Team.UPPER else 1]
+        return {action: [visit, reward] for action, visit, reward in zip(side.actions, side.visit, side.reward) if visit}
+
+    def choose_action(self, stats):
+        """
+        The most visited action (the first one on ties), or with mixed, an action drawn in proportion to the visits.
+        """
+        actions = list(stats)
+        visits = [stats[action][0] for action in actions]
+        if self.mixed:
+            return random.choices(actions, visits)[0]
+        return actions[visits.index(max(visits))]
+
+    def child_nodes(self, board):
+        # board.child is keyed by position, two children in the same position are both in self.children
+        return self.children.get(id(board), {}).values()
+
+    def collapse(self, board):
+        board.child = {}
+        self.children[id(board)] = {}
+
+    def node_visits(self, board):
+        return sum(self.stats[id(board)][0].visit)
+
+    def node_bytes(self):
+        return DECOUPLED_NODE_BYTES
+
+    def keep_statistics(self, nodes):
+        self.stats = {id(node): self.stats[id(node)] for node in nodes if id(node) in self.stats}
+        self.children = {id(node): self.children[id(node)] for node in nodes if id(node) in self.children}
+
+
+# worker processes of the root parallel search, created once and kept for the whole game
+_pools = {}
+
+
+def worker_pool(processes):
+    """
+    The pool of worker processes used by SM_MCTS with that many extra workers.
+    """
+    if processes not in _pools:
+        _pools[processes] = multiprocessing.Pool(processes)
+    return _pools[processes]
+
+
+def close_pools():
+    """
+    Stop the worker processes of all the pools, called when the program exits.
+    """
+    while _pools:
+        processes, pool = _pools.popitem()
+        pool.terminate()
+        pool.join()
+
+
+atexit.register(close_pools)
+
+
+def root_search(mcts, seed, deadline):
+    """
+    One worker of the root parallel SM_MCTS: grow an independent tree with the search made by spawn,
+    until the deadline of the move.
+    Return its root stats, the number of simulations and the plies played by the rollouts.
+    """
+    random.seed(seed)
+    simulations = mcts.search(deadline)
+    return mcts.root_stats(), simulations, mcts.rollout_plies
@@ -1,12 +1,18 @@
 import luv.Enums as Enums
 from luv.Token import Token
-from luv.Coordinate import Coordinate
+from luv.Coordinate import Coordinate, BOARD_COORDINATES, get_coordinate
+from luv.geometry import DISTANCE, HEXES, HEX_INDEX, NEIGHBOURS, NEIGHBOUR_MASK, SWING_TARGETS
 import luv.Action as Action
+import luv.bitboard as bitboard
+import luv.moves as moves
+from luv.bitboard import Bitboard, TYPE_INDEX, TOKEN_TYPES, NUM_HEXES, BEATS, BEATEN_BY
+import luv.zobrist as zobrist
+from luv.fields import distance_field, threat_map, FAR
 from collections import defaultdict
-from copy import deepcopy
+from copy import deepcopy, copy
 INITIAL_THROW = 9
 BOARD_SIDE_LENGTH = 4
-MAX_DIS = 10
+MAX_DIS = FAR
 #TOKEN_TYPE = ['s', 'r', 'p']
 TOKEN_TYPE = [Enums.TokenType.S, Enums.TokenType.R, Enums.TokenType.P]
 
@@ -19,13 +25,25 @@ class Team:
 	team: list
 	teamtype: Enums.Team
 	remaining_throws: int
+	bits: Bitboard
+	key: int
 
 	def __init__(self,teamtype):
 		self.teamtype = teamtype
 		self.team = []
 		self.remaining_throws = INITIAL_THROW
+		# token placement as bitboards, kept in step with the team list
+		self.bits = Bitboard()
+		# zobrist key of the token placement and remaining throws, updated on every change
+		self.side = zobrist.UPPER if teamtype == Enums.Team.UPPER else zobrist.LOWER
+		self.key = zobrist.THROWS[self.side][self.remaining_throws]
+		# hex index -> tokens of the team on that hex
+		self.occupancy = {}
+
 	def __eq__(self, other):
-		return self.teamtype == other.teamtype and self.team == other.team and self.remaining_throws == other.remaining_throws
+		if not isinstance(other, Team):
+			return False
+		return self.key == other.key and self.teamtype == other.teamtype and self.remaining_throws == other.remaining_throws and self.bits == other.bits
 
 	def to_dict(self):
 		if self.teamtype == Enums.Team.LOWER:
@@ -41,7 +59,7 @@ class Team:
 		return "(team: " + str(self.teamtype) + ", tokens: "+ s + ", remaining_throws: " + str(self.remaining_throws) + ")"
 
 	def __hash__(self):
-		return hash(frozenset(self.team)) + hash(self.remaining_throws)
+		return self.key
 
 	def isEmpty(self):
 		"""
@@ -60,6 +78,7 @@ class Team:
 		Add a new throw into the team list and remove the throws by 1.
 		"""
 		self.team.append(newToken)
+		self.place(newToken)
 		return 
 
 	def remove_from_team(self, token):
@@ -67,17 +86,74 @@ class Team:
 		Remove a token from the team.
 		"""
 		self.team.remove(token)
+		self.lift(token)
+		return
+
+	def remove_killed(self, kills):
+		"""
+		Remove all tokens destroyed by a collision.
+		kills: the defeated hex mask of every token type
+		"""
+		alive = []
+		killed = []
+		for index, token in enumerate(self.team):
+			if kills[TYPE_INDEX[token.tokenType]] >> token.position.index & 1:
+				self.lift(token)
+				killed.append((index, token))
+			else:
+				alive.append(token)
+		self.team = alive
+		return killed
+
+	def restore(self, killed):
+		"""
+		Put back the tokens returned by remove_killed, at their old places in the team list.
+		"""
+		for index, token in killed:
+			self.team.insert(index, token)
+			self.place(token)
 		return
 
+	def place(self, token):
+		"""
+		Record a token arriving on its hex in the bitboards, the occupancy map and the key.
+		"""
+		i = token.position.index
+		t = TYPE_INDEX[token.tokenType]
+		k = t * NUM_HEXES + i
+		count = self.bits.counts[k]
+		self.key ^= zobrist.piece(self.side, k, count) ^ zobrist.piece(self.side, k, count + 1)
+		self.bits.place(t, i)
+		stack = self.occupancy.get(i)
+		if stack is None:
+			self.occupancy[i] = [token]
+		else:
+			stack.append(token)
+
+	def lift(self, token):
+		"""
+		Record a token leaving its hex in the bitboards, the occupancy map and the key.
+		"""
+		i = token.position.index
+		t = TYPE_INDEX[token.tokenType]
+		k = t * NUM_HEXES + i
+		count = self.bits.counts[k]
+		self.key ^= zobrist.piece(self.side, k, count) ^ zobrist.piece(self.side, k, count - 1)
+		self.bits.lift(t, i)
+		stack = self.occupancy[i]
+		if len(stack) == 1:
+			del self.occupancy[i]
+		else:
+			stack.remove(token)
+
 	def gettoken(self, x, y):
 		"""
 		Get token from the team based on position: (x,y)
 		"""
-		coordinate = Coordinate(x,y)
-		for element in self.team:
-			if element.position == coordinate:
-				return element
-		return None
+		coordinate = get_coordinate(x,y)
+		if coordinate is None:
+			return None
+		return self.token_at(coordinate.index)
 
 	def getActions(self, tokenList, opponent_tokens):
 		"""
@@ -111,28 +187,53 @@ class Team:
 		team_sorted = sorted(dic,key = dic.get)
 		return team_sorted
 
-	def getLimitedActions(self, opponent_tokens, max_actions):
+	def getLimitedActions(self, opponent, max_actions):
 		"""
-		Restrict the output action numbers.
-		opponent_tokens: a list of opponent tokens
+		Restrict the output action numbers, see getLimitedCodes.
+		Return the actions as Action objects.
+		"""
+		return [self.to_action(code) for code in self.getLimitedCodes(opponent, max_actions)]
+
+	def distance_fields(self):
+		"""
+		Distance from every hex to the nearest token of this team, for each token type index (luv.fields).
+		"""
+		masks = self.bits.masks
+		return (distance_field(masks[0]), distance_field(masks[1]), distance_field(masks[2]))
+
+	def threats(self):
+		"""
+		Hexes the tokens of this team reach in one slide or swing, for each token type index (luv.fields).
+		"""
+		return threat_map(self.bits.masks)
+
+	def getLimitedCodes(self, opponent, max_actions):
+		"""
+		Restrict the output action numbers. Actions are move codes (luv.moves).
+		opponent: the opponent team
 		max_actions: the maximum number of actions it can return
 		"""
+		fields = opponent.distance_fields()
+		# hexes where each token type of ours can be taken next turn: reached by the enemy type, or held by it
+		threats = opponent.threats()
+		danger = [threats[BEATEN_BY[t]] | opponent.bits.masks[BEATEN_BY[t]] for t in range(3)]
 		# have target means the token have target to move to
 		have_Target = []
-		actions = self.getMoveActions()
+		actions = self.getMoveCodes()
 		if actions:
 			zeros = []
 			escape = []
 			for action in actions:
-				dis = [action.to_point.distance(token.position) for token in opponent_tokens if TARGETS[action.token.tokenType] == token.tokenType]
-				enemy_dis = [action.token.position.distance(enemy.position) for enemy in opponent_tokens if ENEMIES[action.token.tokenType] == enemy.tokenType]
+				t = action >> 12 & 3
+				# MAX_DIS if the opponent has no target of the token
+				dis = fields[BEATS[t]][action & 63]
 				# avoid going to much
-				if len(dis) != 0 and min(dis) <= MAX_DIS/2:
+				if dis <= MAX_DIS/2:
 					have_Target.append(action)
-				if len(dis) != 0 and min(dis) == 0:
+				if dis == 0:
 					zeros.append(action)
-				# enemy just one step
-				if len(enemy_dis) != 0 and min(enemy_dis) == 1:
+				# an enemy reaches the token by a slide or a swing, and can't reach the destination
+				if threats[BEATEN_BY[t]] >> (action >> 6 & 63) & 1 and not danger[t] >> (action & 63) & 1:
 					escape.append(action)
 			if len(zeros) > 0:
 				return zeros
@@ -142,37 +243,34 @@ class Team:
 				return escape
 		# to restrict the throw actions, we limit the number of throws 
 		#  if the token has target on the board, then we expand the actions with limit throw
-		have_Target = self.sort_actions(have_Target, opponent_tokens)
+		have_Target = self.sort_actions(have_Target, opponent)
 		if len(have_Target) != 0:
-			have_Target.extend(self.limit_throw(opponent_tokens))
+			have_Target.extend(self.limit_throw(opponent))
 		# if no actions but have throws, just expand with throws
 		elif self.remaining_throws != 0:
-			have_Target = self.getThrowActions()
+			have_Target = self.getThrowCodes()
 		# else no throw or no avaible action, just choose all move actions
 		else:
 			have_Target = actions
 		have_Target = self.filter_action(have_Target)
-		sorted_actions = self.sort_actions(have_Target, opponent_tokens)
+		sorted_actions = self.sort_actions(have_Target, opponent)
 		if len(sorted_actions) < max_actions:
 			return sorted_actions 
 		return sorted_actions[0:max_actions]
 	
 	def filter_action(self, actions):
 		"""
-		Filter out actions which eat token from the same team.
+		Filter out actions (move codes) which eat token from the same team.
 		"""
-		no_collision = []
-		for action in actions:
-			collides = [x for x in self.team if x.position.distance(action.to_point) == 0]
-			if not collides:
-				no_collision.append(action)
-		return no_collision
+		occupied = self.bits.occupied()
+		return [action for action in actions if not occupied >> (action & 63) & 1]
 			
 
-	def limit_throw(self, opponent_tokens):
+	def limit_throw(self, opponent):
 		"""
 		We want to limited the throw actions, so we set limit the number of each type throws.
 		Also consider the current types on the board so the we want the token on the board be more diversity.
+		Return move codes.
 		"""
 
 		# Limit throws to very specific scenarios
@@ -180,38 +278,36 @@ class Team:
 		# 2. We can throw directly onto a target token and kill it when there are no nearby tokens that could kill it
 		
 
-		throws = self.getThrowActions()
+		throws = self.getThrowCodes()
 		if len(throws) == 0:
 			return []
+		fields = opponent.distance_fields()
 		filtered_throws = []
 
 		for throw in throws:
-			distances = [throw.to_point.distance(token.position) for token in opponent_tokens if TARGETS[throw.tokenType] == token.tokenType]
-			distances.append(MAX_DIS)
-			if min(distances) == 0:
+			if fields[BEATS[throw >> 12 & 3]][throw & 63] == 0:
 				filtered_throws.append(throw)
 
 		flag = False
 		ttypes = {ttype for ttype in Enums.TokenType}
-		for opponent in opponent_tokens:
-			if ENEMIES[opponent.tokenType] not in ttypes:
+		for opponent_token in opponent.team:
+			if ENEMIES[opponent_token.tokenType] not in ttypes:
 				continue
 			for token in self.team:
-				if TARGETS[token.tokenType] == opponent.tokenType:
+				if TARGETS[token.tokenType] == opponent_token.tokenType:
 					ttypes.remove(token.tokenType)
 					break
 
 		if len(ttypes) != 0:
 			for ttype in ttypes:
+				t = TYPE_INDEX[ttype]
+				field = fields[BEATS[t]]
 				min_dist = MAX_DIS
 				min_dist_throw = throws[0]
 				for throw in throws:
-					if throw.tokenType == ttype:
-						distances = [throw.to_point.distance(token.position) for token in opponent_tokens if TARGETS[throw.tokenType] == token.tokenType]
-						distances.append(MAX_DIS)
-						if min(distances) < min_dist:
-							min_dist = min(distances)
-							min_dist_throw = throw
+					if throw >> 12 & 3 == t and field[throw & 63] < min_dist:
+						min_dist = field[throw & 63]
+						min_dist_throw = throw
 
 				filtered_throws.append(min_dist_throw)
 
@@ -219,31 +315,23 @@ class Team:
 
 
 
-	def sort_actions(self, actions, opponent_tokens):
+	def sort_actions(self, actions, opponent):
 		"""
 		Sort action list based on their distance to the closest opponent.
-		actions: a list of actions
-		opponent_tokens: all opponent tokens
+		actions: a list of move codes
+		opponent: the opponent team
 		"""
 
-		if not actions or not opponent_tokens:
+		if not actions or not opponent.team:
 			return actions
+		fields = opponent.distance_fields()
 		ac_tup_list = []
 		for action in actions:
 			if not action:
 				continue
-			if isinstance(action, Action.ThrowAction):
-				token_type = action.tokenType
-			else:
-				token_type = action.token.tokenType
-			# got all distances to opponent
-			distances = [action.to_point.distance(x.position) for x in opponent_tokens if TARGETS[token_type] == x.tokenType]
-			if len(distances) == 0:
-				#make the distance 10 since this is greater than the maximum distance. 
-				dis = MAX_DIS
-			else:
-				dis = min(distances)
-			if isinstance(action, Action.ThrowAction):
+			# distance to the closest target, MAX_DIS (greater than the maximum distance) if there is none
+			dis = fields[BEATS[action >> 12 & 3]][action & 63]
+			if action >> 14 == moves.THROW:
 				dis = dis * 1.1
 
 			ac_tup_list.append((action, dis))
@@ -252,66 +340,181 @@ class Team:
 		return [action for (action, dis) in ac_tup_list]
 
 
+	def move_destinations(self):
+		"""
+		Slide and swing destinations of all tokens in one pass over the occupied hexes.
+		Return (token, hex index, swing hexes) for every token in team order,
+		the slide hexes are NEIGHBOURS[hex index].
+		"""
+		# swings through several allies are ordered by the team order of the allies,
+		# so rank every occupied hex by the first team token on it
+		rank = {}
+		for index, token in enumerate(self.team):
+			rank.setdefault(token.position.index, index)
+		allies = self.bits.occupied()
+
+		# destinations only depend on the hex, compute them once for a stack of tokens
+		destinations = {}
+		result = []
+		for token in self.team:
+			i = token.position.index
+			swings = destinations.get(i)
+			if swings is None:
+				swings = []
+				ally_hexes = NEIGHBOUR_MASK[i] & allies
+				if ally_hexes:
+					swing_targets = SWING_TARGETS[i]
+					seen = 0
+					for j in sorted(bitboard.bits(ally_hexes), key=rank.__getitem__):
+						for k in swing_targets[j]:
+							if not seen >> k & 1:
+								seen |= 1 << k
+								swings.append(k)
+				destinations[i] = swings
+			result.append((token, i, swings))
+		return result
+
+	def getMoveCodes(self):
+		"""
+		Generate the move codes of all tokens, in the same order as getMoveActions.
+		"""
+		codes = []
+		for token, i, swings in self.move_destinations():
+			t = TYPE_INDEX[token.tokenType]
+			codes.extend(moves.SLIDE_CODES[t][i])
+			if swings:
+				base = moves.encode(moves.SWING, t, i, 0)
+				codes.extend([base | k for k in swings])
+		return codes
+
 	def getMoveActions(self):
-		"""Generate all move actions of all tokens"""
+		"""
+		Generate all move actions of all tokens.
+		The actions come in the same order as Token.getTokenActions called for every token.
+		"""
 		actions = []
-		for token in self.team:
-			actions.extend(token.getTokenActions(self.team))
+		for token, i, swings in self.move_destinations():
+			actions.extend([Action.SlideAction(token, BOARD_COORDINATES[j]) for j in NEIGHBOURS[i]])
+			actions.extend([Action.SwingAction(token, BOARD_COORDINATES[k]) for k in swings])
 		return actions
-	
 
+	def token_at(self, i):
+		"""
+		Get the token on hex index i, the first one in team order if several share the hex.
+		"""
+		stack = self.occupancy.get(i)
+		if stack is None:
+			return None
+		if len(stack) == 1:
+			return stack[0]
+		for element in self.team:
+			if element.position.index == i:
+				return element
 
-	def update(self, action):
+	def to_action(self, code):
 		"""
-		Update the team based on the received action.
-		action: a tuple represents action
+		Build the Action object of a move code of this team.
+		"""
+		to_point = BOARD_COORDINATES[code & 63]
+		kind = code >> 14
+		if kind == moves.THROW:
+			return Action.ThrowAction(TOKEN_TYPES[code >> 12 & 3], to_point)
+		token = self.token_at(code >> 6 & 63)
+		if kind == moves.SLIDE:
+			return Action.SlideAction(token, to_point)
+		return Action.SwingAction(token, to_point)
+
+	def encode(self, action):
+		"""
+		Move code of an action of this team given in the tuple format.
 		"""
 		if action[0] == "THROW":
 			(_, tokenType, position) = action
-			# position (r, q)
-			#newToken = Token(position, self, tokenType)
-			newToken = Token(position, self.teamtype, tokenType)
+			if not isinstance(tokenType, Enums.TokenType):
+				tokenType = Enums.TokenType(tokenType)
+			return moves.encode(moves.THROW, TYPE_INDEX[tokenType], 0, HEX_INDEX[tuple(position)])
+		(atype, from_point, to_point) = action
+		i = HEX_INDEX[tuple(from_point)]
+		token = self.token_at(i)
+		return moves.encode(moves.KINDS[atype], TYPE_INDEX[token.tokenType], i, HEX_INDEX[tuple(to_point)])
+
+	def update(self, action):
+		"""
+		Update the team based on the received action.
+		action: a move code, or a tuple represents action
+		Return what revert needs to undo the action: None for a throw,
+		otherwise (moved token, its previous position).
+		"""
+		if not isinstance(action, int):
+			action = self.encode(action)
+		if action >> 14 == moves.THROW:
+			newToken = Token(HEXES[action & 63], self.teamtype, TOKEN_TYPES[action >> 12 & 3])
 			self.add_to_team(newToken)
+			self.key ^= zobrist.THROWS[self.side][self.remaining_throws] ^ zobrist.THROWS[self.side][self.remaining_throws - 1]
 			self.remaining_throws -= 1
+			return None
 
 		# it is a slide or swing action
-		else:
-			(atype, (ra, qa), (rb, qb)) = action
-			# get point from ra, qa and move to rb, qb
-			original = self.gettoken(ra, qa)
-			original.update(rb,qb)
+		original = self.token_at(action >> 6 & 63)
+		previous = original.position
+		self.lift(original)
+		original.position = BOARD_COORDINATES[action & 63]
+		self.place(original)
+		return (original, previous)
+
+	def revert(self, undo):
+		"""
+		Undo the last update.
+		undo: the value returned by that update
+		"""
+		if undo is None:
+			# a throw always appends the new token to the end of the team
+			token = self.team.pop()
+			self.lift(token)
+			self.key ^= zobrist.THROWS[self.side][self.remaining_throws] ^ zobrist.THROWS[self.side][self.remaining_throws + 1]
+			self.remaining_throws += 1
+			return
+		token, previous = undo
+		self.lift(token)
+		token.position = previous
+		self.place(token)
 		return
+
+	def copy(self):
+		"""
+		Copy of the team that can be updated independently.
+		Tokens are copied shallowly, their positions are never mutated, only replaced.
+		"""
+		team = Team.__new__(Team)
+		team.teamtype = self.teamtype
+		team.team = [copy(token) for token in self.team]
+		team.remaining_throws = self.remaining_throws
+		team.bits = self.bits.copy()
+		team.side = self.side
+		team.key = self.key
+		team.occupancy = {}
+		for token in team.team:
+			stack = team.occupancy.get(token.position.index)
+			if stack is None:
+				team.occupancy[token.position.index] = [token]
+			else:
+				stack.append(token)
+		return team
 	
 	def getThrowActions(self):
 		"""
-		Get possible valid throw actions for the team. The action list haven't sort by priority.
+		Get possible valid throw actions for the team, see getThrowCodes.
+		"""
+		return [self.to_action(code) for code in self.getThrowCodes()]
+
+	def getThrowCodes(self):
+		"""
+		Get possible valid throw actions for the team as move codes. The action list haven't sort by priority.
 		!Since it generates all posible throws actions, which means we can further improve it by only generating most possible throw actions.!
 		!Current don't eliminate the case when throws have collision with team member!
-		:param tokens: all team tokens
 		"""
 		# return an empty list if we have already made 9 throws
 		if self.remaining_throws == 0:
 			return []
-
-		actions = []
-		# available throw region
-		if self.teamtype == Enums.Team.UPPER:
-			# count from the top row down
-			# from_row < to_row
-			to_row = BOARD_SIDE_LENGTH
-			from_row = BOARD_SIDE_LENGTH - (INITIAL_THROW - self.remaining_throws)
-						
-		elif self.teamtype == Enums.Team.LOWER:
-			from_row = -BOARD_SIDE_LENGTH
-			to_row = -BOARD_SIDE_LENGTH + (INITIAL_THROW - self.remaining_throws)
-
-		for row in range(from_row, to_row+1):
-				for col in range(-BOARD_SIDE_LENGTH, BOARD_SIDE_LENGTH + 1):
-					cell = Coordinate(row, col)
-					if cell.isOnBoard():
-						for tokenType in TOKEN_TYPE:
-							actions.append(Action.ThrowAction(tokenType, cell))
-		return actions
-
-
-
+		# available throw region: upper counts from the top row down, lower from the bottom row up
+		return list(moves.THROW_CODES[self.teamtype][INITIAL_THROW - self.remaining_throws])
@@ -1,11 +1,9 @@
-from luv.Coordinate import Coordinate
+from luv.Coordinate import Coordinate, BOARD_COORDINATES, get_coordinate
+from luv.geometry import ALL_DIRECTIONS, DISTANCE, NEIGHBOURS, NEIGHBOUR_MASK, SWING_TARGETS, STEP
 import luv.Action as Action
 import luv.Enums as Enums
 from copy import deepcopy
 from collections import defaultdict
-# all posible moving directions for a token
-ALL_DIRECTIONS = [(0, -1), (-1, 0), (-1, 1), (0, 1), (1, 0), (1, -1)]
-
 TARGETS = {Enums.TokenType.S: Enums.TokenType.P, Enums.TokenType.P: Enums.TokenType.R, Enums.TokenType.R: Enums.TokenType.S}
 ENEMIES = {Enums.TokenType.S: Enums.TokenType.R, Enums.TokenType.R: Enums.TokenType.P, Enums.TokenType.P: Enums.TokenType.S}
 
@@ -16,7 +14,7 @@ class Token:
 	ttype: Enums.TokenType
 
 	def __init__(self, position, team, ttype):
-		self.position = Coordinate(position[0], position[1])
+		self.position = get_coordinate(position[0], position[1])
 		self.team = team
 		self.tokenType = ttype
 
@@ -39,38 +37,35 @@ class Token:
 		return "(tokenType: " +  str(self.tokenType) + ", position:" + self.position.toString() +")"
 
 
-	def getTokenActions(self, tokens):
+	def getTokenActions(self, tokens, allies=None):
 		"""
 		Get possible valid move actions for the token.
 		:param tokens: all tokens in the team
+		:param allies: occupancy mask of the team, built from tokens if not given
 		"""
-		# get all slide hexes
-		slide_hexes = [self.getSlideCoordinates(direction) for direction in ALL_DIRECTIONS]
-		swing_hexes = []
-
-		# get all swing actions regardless of validity
-		neighbouring_hexes = slide_hexes
-		for token in tokens:
-			for neighbouring_hex in neighbouring_hexes:
-				# check for tokens in neighbouring hexes
-				# if one of its team members in its neighbourhood, then token can swing
-				if token.position == neighbouring_hex:
-					new_swings = [token.getSlideCoordinates(direction) for direction in ALL_DIRECTIONS]
-					for new_swing in new_swings:
-						# don't append moves that are already in the list
-						if new_swing not in swing_hexes and new_swing not in slide_hexes:
-							swing_hexes.append(new_swing)
-
-		# remove the current position of the token from the list
-		if self.position in swing_hexes:
-			swing_hexes.remove(self.position)
-
-
-		actions = [Action.SlideAction(self, slide_hex) for slide_hex in slide_hexes]
-		actions.extend([Action.SwingAction(self, swing_hex) for swing_hex in swing_hexes])
-
-		# remove invalid actions
-		actions = [action for action in actions if action.isValid()]
+		i = self.position.index
+		if allies is None:
+			allies = 0
+			for token in tokens:
+				allies |= 1 << token.position.index
+
+		# all slide hexes, off-board hexes are never in the neighbour table
+		slides = NEIGHBOUR_MASK[i]
+		actions = [Action.SlideAction(self, BOARD_COORDINATES[j]) for j in NEIGHBOURS[i]]
+
+		# if one of its team members in its neighbourhood, then token can swing
+		if slides & allies:
+			# the swing table already leaves out the slides and the token's own hex,
+			# seen drops hexes reachable through two different allies
+			swing_targets = SWING_TARGETS[i]
+			seen = 0
+			for token in tokens:
+				j = token.position.index
+				if slides >> j & 1:
+					for k in swing_targets[j]:
+						if not seen >> k & 1:
+							seen |= 1 << k
+							actions.append(Action.SwingAction(self, BOARD_COORDINATES[k]))
 		return actions
 
 	
@@ -106,12 +101,13 @@ class Token:
 	def getSlideCoordinates(self, direction):
 		''' 
 		Finds and returns the hex coordinates to which the token will slide in the given direction. 
-		Does not check if the slide is valid (off the board, enemy tokens)
+		Returns None if the hex is off the board, does not check for enemy tokens.
 		:param direction: (dx, dy)
 		'''
-
-		delta_x, delta_y = direction
-		return Coordinate(self.position.x + delta_x, self.position.y + delta_y)
+		j = STEP[self.position.index][ALL_DIRECTIONS.index(direction)]
+		if j is None:
+			return None
+		return BOARD_COORDINATES[j]
 
 
 	def update(self, x_to, y_to):
@@ -119,7 +115,7 @@ class Token:
 		Update the token to a new position
 		"""
 
-		self.position = Coordinate(x_to, y_to)
+		self.position = get_coordinate(x_to, y_to)
 
 
 	def defeated(self, tokens):
@@ -136,9 +132,10 @@ class Token:
 		""" Return the nearest target."""
 		# set min_dist to be greater than the largest possible distance on the board
 		min_dist = 10
+		from_distance = DISTANCE[self.position.index]
 		for opponent in others:
 			if TARGETS[self.tokenType] == opponent.tokenType:
-				dist = self.position.distance(opponent.position)
+				dist = from_distance[opponent.position.index]
 				if dist < min_dist:
 					min_dist = dist
 					target = opponent
@@ -0,0 +1,162 @@
+"""
+Arena node store for MCTS: the tree is a struct of arrays in preallocated
+NumPy buffers, a node is an index into them. Nodes don't hold a position,
+only the joint action (moves.joint_action) leading to them from their parent,
+so a position is rebuilt by applying the actions from the root.
+The children of a node are allocated together in one block.
+"""
+import numpy as np
+
+# the buffers grow by this many nodes at a time
+CHUNK = 1 << 14
+NONE = -1
+
+
+class NodeStore:
+	"""
+	visit: number of simulations through the node
+	value: sum of the simulation results through the node
+	parent: index of the parent, NONE for the root
+	first_child, num_children: block of the children, first_child is NONE until the node is expanded
+	action: joint action leading to the node from its parent
+	"""
+	size: int
+
+	def __init__(self, capacity=CHUNK):
+		self.size = 0
+		self.visit = np.zeros(capacity, dtype=np.int32)
+		self.value = np.zeros(capacity, dtype=np.float64)
+		self.parent = np.full(capacity, NONE, dtype=np.int32)
+		self.first_child = np.full(capacity, NONE, dtype=np.int32)
+		self.num_children = np.zeros(capacity, dtype=np.int16)
+		self.action = np.zeros(capacity, dtype=np.int64)
+		self.new_root()
+
+	def __len__(self):
+		return self.size
+
+	def capacity(self):
+		return len(self.visit)
+
+	def nbytes(self):
+		"""
+		Bytes held by the buffers (all the capacity, not only the nodes in use).
+		"""
+		return sum(array.nbytes for array in (self.visit, self.value, self.parent, self.first_child, self.num_children, self.action))
+
+	def node_bytes(self):
+		"""
+		Bytes per node.
+		"""
+		return self.nbytes() // self.capacity()
+
+	def grow(self, needed):
+		"""
+		Add chunks to the buffers until needed more nodes fit.
+		"""
+		capacity = self.capacity()
+		new_capacity = capacity
+		while new_capacity < self.size + needed:
+			new_capacity += CHUNK
+		if new_capacity == capacity:
+			return
+		extra = new_capacity - capacity
+		self.visit = np.concatenate((self.visit, np.zeros(extra, dtype=np.int32)))
+		self.value = np.concatenate((self.value, np.zeros(extra, dtype=np.float64)))
+		self.parent = np.concatenate((self.parent, np.full(extra, NONE, dtype=np.int32)))
+		self.first_child = np.concatenate((self.first_child, np.full(extra, NONE, dtype=np.int32)))
+		self.num_children = np.concatenate((self.num_children, np.zeros(extra, dtype=np.int16)))
+		self.action = np.concatenate((self.action, np.zeros(extra, dtype=np.int64)))
+
+	def new_root(self):
+		"""
+		Allocate the root node, index 0 of an empty store.
+		"""
+		self.size = 1
+		self.visit[0] = 0
+		self.value[0] = 0
+		self.parent[0] = NONE
+		self.first_child[0] = NONE
+		self.num_children[0] = 0
+
+	def expand(self, node, actions):
+		"""
+		Allocate the children of node, one per joint action, in one block.
+		Return the index of the first child.
+		"""
+		n = len(actions)
+		self.grow(n)
+		first = self.size
+		block = slice(first, first + n)
+		self.visit[block] = 0
+		self.value[block] = 0
+		self.parent[block] = node
+		self.first_child[block] = NONE
+		self.num_children[block] = 0
+		self.action[block] = actions
+		self.first_child[node] = first
+		self.num_children[node] = n
+		self.size += n
+		return first
+
+	def children(self, node):
+		"""
+		Slice of the children block of node.
+		"""
+		first = self.first_child[node]
+		return slice(first, first + self.num_children[node])
+
+	def find_child(self, node, action):
+		"""
+		Index of the child of node reached by the joint action, NONE if there is none.
+		"""
+		if self.first_child[node] == NONE:
+			return NONE
+		block = self.children(node)
+		found = np.flatnonzero(self.action[block] == action)
+		if not len(found):
+			return NONE
+		return int(block.start + found[0])
+
+	def backpropagate(self, path, result):
+		"""
+		Add one visit and the result to every node of the path (indexes, no node twice).
+		"""
+		self.visit[path] += 1
+		self.value[path] += result
+
+	def reroot(self, node):
+		"""
+		Make node the root: its subtree is copied to the front of the buffers,
+		breadth first so that every children block stays contiguous, and the rest is dropped.
+		"""
+		old = (self.visit.copy(), self.value.copy(), self.first_child.copy(), self.num_children.copy(), self.action.copy())
+		visit, value, first_child, num_children, action = old
+		self.size = 1
+		self.visit[0] = visit[node]
+		self.value[0] = value[node]
+		self.parent[0] = NONE
+		self.action[0] = 0
+		# (old index, new index) of the nodes whose children are still to copy
+		queue = [(node, 0)]
+		while queue:
+			next_queue = []
+			for old_node, new_node in queue:
+				if first_child[old_node] == NONE:
+					self.first_child[new_node] = NONE
+					self.num_children[new_node] = 0
+					continue
+				n = int(num_children[old_node])
+				start = int(first_child[old_node])
+				first = self.size
+				new_block = slice(first, first + n)
+				old_block = slice(start, start + n)
+				self.visit[new_block] = visit[old_block]
+				self.value[new_block] = value[old_block]
+				self.action[new_block] = action[old_block]
+				self.parent[new_block] = new_node
+				self.first_child[new_node] = first
+				self.num_children[new_node] = n
+				self.size += n
+				next_queue.extend(zip(range(start, start + n), range(first, first + n)))
+			queue = next_queue
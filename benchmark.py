@@ -0,0 +1,840 @@
+"""
+Benchmarks for the game engine and the search strategies.
+Run from the directory containing the luv package:
+
+    python -m luv.benchmark [name ...]
+
+With no names, every benchmark is run.
+"""
+
+import os
+import sys
+import time
+import random
+import tracemalloc
+from collections import defaultdict
+from copy import deepcopy
+
+import numpy as np
+
+import luv.Enums as Enums
+import luv.Action as Action
+from luv.Board import Board
+from luv.Team import Team
+from luv.player import Player
+from luv.Strategy import SM_MCTS, Decoupled_SM_MCTS, Arena_SM_MCTS, AlphaBeta_cutoff_MinMax, SMAB, Equilibrium_payoff, UCB, EXP3
+from luv.gametheory import solve_game as solve_game_lp
+from luv.matrixgame import solve_game, equilibrium, regret_matching
+from luv.transposition import TranspositionTable, AlphaBetaTable
+from luv.evaluation import encode_boards, distance_scores, material_scores
+from luv.rollout import batch_rollout, material, RankedPolicy, RandomPolicy, CutoffPolicy
+from luv.Token import Token
+from luv.Coordinate import Coordinate, BOARD_COORDINATES
+from luv.geometry import ALL_DIRECTIONS, BOARD_SIDE_LENGTH, DISTANCE, HEXES, NEIGHBOURS, NEIGHBOUR_MASK, hex_distance
+from luv.bitboard import TYPE_INDEX, BEATEN_BY
+
+WIN = 1
+LOSE = -1
+DRAW = 0
+# number of actions per side used by the rollouts, same as SM_MCTS.simulation
+ROLLOUT_ACTIONS = 5
+
+
+def random_rollout(board, rng):
+    """
+    Play random joint actions from board until the game ends.
+    Return the number of plies played.
+    """
+    node = board
+    steps = 0
+    while not node.goal_test():
+        upper_actions = node.getActions(Enums.Team.UPPER, ROLLOUT_ACTIONS)
+        lower_actions = node.getActions(Enums.Team.LOWER, ROLLOUT_ACTIONS)
+        comb = list(zip(upper_actions, lower_actions))
+        action = comb[rng.randint(0, len(comb) - 1)]
+        node = node.update_board(action[0].represent(), action[1].represent())
+        # rollouts never walk back up, don't keep the whole game alive
+        node.parent = None
+        steps += 1
+    return steps
+
+
+def inplace_rollout(board, rng):
+    """
+    Same as random_rollout, but plays move codes on board with apply and takes it all back.
+    """
+    steps = 0
+    while not board.goal_test():
+        upper_actions = board.getActionCodes(Enums.Team.UPPER, ROLLOUT_ACTIONS)
+        lower_actions = board.getActionCodes(Enums.Team.LOWER, ROLLOUT_ACTIONS)
+        comb = list(zip(upper_actions, lower_actions))
+        action = comb[rng.randint(0, len(comb) - 1)]
+        board.apply(action[0], action[1])
+        steps += 1
+    for _ in range(steps):
+        board.undo()
+    return steps
+
+
+def bench_rollout(seconds=5.0, seed=0):
+    """
+    Rollout steps per second through Board.getActions, update_board and goal_test.
+    """
+    rng = random.Random(seed)
+    steps = games = 0
+    begin = time.perf_counter()
+    while time.perf_counter() - begin < seconds:
+        steps += random_rollout(Board(Enums.Team.UPPER, None), rng)
+        games += 1
+    elapsed = time.perf_counter() - begin
+    print("rollout: {} games, {} steps in {:.2f}s -> {:.0f} steps/s".format(games, steps, elapsed, steps / elapsed))
+    return steps / elapsed
+
+
+def bench_rollout_inplace(seconds=5.0, seed=0):
+    """
+    Rollout steps per second with Board.apply/undo, no board allocated per ply.
+    """
+    rng = random.Random(seed)
+    board = Board(Enums.Team.UPPER, None)
+    steps = games = 0
+    begin = time.perf_counter()
+    while time.perf_counter() - begin < seconds:
+        steps += inplace_rollout(board, rng)
+        games += 1
+    elapsed = time.perf_counter() - begin
+    print("rollout (apply/undo): {} games, {} steps in {:.2f}s -> {:.0f} steps/s".format(games, steps, elapsed, steps / elapsed))
+    return steps / elapsed
+
+
+def _arithmetic_neighbours(coordinate):
+    """
+    Neighbours the way they were computed before the geometry tables:
+    a new Coordinate per direction, then an on-board check.
+    """
+    neighbours = []
+    for dx, dy in ALL_DIRECTIONS:
+        x, y = coordinate.x + dx, coordinate.y + dy
+        if -BOARD_SIDE_LENGTH <= x <= BOARD_SIDE_LENGTH and -BOARD_SIDE_LENGTH <= y <= BOARD_SIDE_LENGTH and -BOARD_SIDE_LENGTH <= x + y <= BOARD_SIDE_LENGTH:
+            neighbours.append(Coordinate(x, y))
+    return neighbours
+
+
+def bench_geometry(repeat=200000, seed=0):
+    """
+    Distance and adjacency lookups: arithmetic versus the geometry tables.
+    """
+    rng = random.Random(seed)
+    pairs = [(rng.randrange(len(HEXES)), rng.randrange(len(HEXES))) for _ in range(repeat)]
+    coordinate_pairs = [(BOARD_COORDINATES[i], BOARD_COORDINATES[j]) for i, j in pairs]
+
+    def timed(label, fn):
+        begin = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - begin
+        print("geometry: {:<32} {:.1f} ns/call".format(label, elapsed / repeat * 1e9))
+
+    timed("distance, arithmetic", lambda: [hex_distance((a.x, a.y), (b.x, b.y)) for a, b in coordinate_pairs])
+    timed("distance, Coordinate.distance", lambda: [a.distance(b) for a, b in coordinate_pairs])
+    timed("distance, table read", lambda: [DISTANCE[i][j] for i, j in pairs])
+    timed("neighbours, arithmetic", lambda: [_arithmetic_neighbours(a) for a, b in coordinate_pairs])
+    timed("neighbours, table read", lambda: [NEIGHBOURS[i] for i, j in pairs])
+
+
+def midgame_board(seed=0, plies=20):
+    """
+    A board reached by random play from the start, usually with most tokens thrown.
+    """
+    rng = random.Random(seed)
+    board = Board(Enums.Team.UPPER, None)
+    for _ in range(plies):
+        upper_actions = board.getActions(Enums.Team.UPPER, 1000)
+        lower_actions = board.getActions(Enums.Team.LOWER, 1000)
+        child = board.update_board(rng.choice(upper_actions).represent(), rng.choice(lower_actions).represent())
+        if child.goal_test():
+            break
+        board = child
+        board.parent = None
+    return board
+
+
+def bench_board_memory(boards=2000, seed=0):
+    """
+    Bytes allocated per child board built by update_board from a midgame position.
+    """
+    board = midgame_board(seed)
+    upper_action = board.getActions(Enums.Team.UPPER, 1)[0].represent()
+    lower_action = board.getActions(Enums.Team.LOWER, 1)[0].represent()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    children = [board.update_board(upper_action, lower_action) for _ in range(boards)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print("board memory: {} tokens, {:.0f} bytes per board".format(len(board.uppers.team) + len(board.lowers.team), (after - before) / len(children)))
+    return (after - before) / len(children)
+
+
+def _reference_move_actions(team):
+    """
+    Move generation as it was written originally (Token.getTokenActions with
+    coordinate arithmetic and list membership), kept to time and test the fast path against.
+    """
+    actions = []
+    for token in team.team:
+        slide_hexes = [Coordinate(token.position.x + dx, token.position.y + dy) for dx, dy in ALL_DIRECTIONS]
+        swing_hexes = []
+        for other in team.team:
+            for neighbouring_hex in slide_hexes:
+                if other.position == neighbouring_hex:
+                    for dx, dy in ALL_DIRECTIONS:
+                        new_swing = Coordinate(other.position.x + dx, other.position.y + dy)
+                        if new_swing not in swing_hexes and new_swing not in slide_hexes:
+                            swing_hexes.append(new_swing)
+        if token.position in swing_hexes:
+            swing_hexes.remove(token.position)
+        token_actions = [Action.SlideAction(token, slide_hex) for slide_hex in slide_hexes]
+        token_actions.extend([Action.SwingAction(token, swing_hex) for swing_hex in swing_hexes])
+        actions.extend([action for action in token_actions if action.isValid()])
+    return actions
+
+
+def random_team(rng, tokens, teamtype=Enums.Team.UPPER, radius=4):
+    """
+    A team of randomly placed tokens within radius of the centre.
+    Tokens of the same type may stack, tokens of different types never share a hex.
+    """
+    team = Team(teamtype)
+    hexes = [rq for rq in HEXES if hex_distance(rq, (0, 0)) <= radius]
+    placed = {}
+    while len(team.team) < tokens:
+        rq = rng.choice(hexes)
+        ttype = rng.choice(list(Enums.TokenType))
+        if placed.setdefault(rq, ttype) != ttype:
+            continue
+        team.add_to_team(Token(rq, teamtype, ttype))
+    return team
+
+
+def bench_move_generation(positions=500, repeat=20, seed=0):
+    """
+    Move generation time per team on 9-token midgame positions
+    (tests/test_moves.py checks the generated moves against the original ones).
+    """
+    rng = random.Random(seed)
+    teams = [random_team(rng, 9, radius=2) for _ in range(positions)]
+
+    def timed(label, fn):
+        begin = time.perf_counter()
+        for _ in range(repeat):
+            for team in teams:
+                fn(team)
+        elapsed = time.perf_counter() - begin
+        print("move generation: {:<24} {:.1f} us/team".format(label, elapsed / (repeat * len(teams)) * 1e6))
+
+    timed("original", _reference_move_actions)
+    timed("per token", lambda team: [action for token in team.team for action in token.getTokenActions(team.team)])
+    timed("one pass (occupancy)", Team.getMoveActions)
+    timed("one pass, move codes", Team.getMoveCodes)
+
+
+def bench_parallel_mcts(seconds=2.0, positions=3, workers=(1, 2, 4, 8)):
+    """
+    Total SM_MCTS simulations per second with root parallelisation, for each number of workers.
+    Speedups beyond os.cpu_count() workers are not expected.
+    """
+    boards = [midgame_board(seed, plies=10) for seed in range(positions)]
+    base = None
+    for n in workers:
+        simulations = elapsed = 0
+        for board in boards:
+            mcts = SM_MCTS(board.copy(None), seconds, n)
+            begin = time.perf_counter()
+            mcts.actions()
+            elapsed += time.perf_counter() - begin
+            simulations += mcts.simulations
+        rate = simulations / elapsed
+        base = base or rate
+        print("parallel mcts: {} workers ({} cpus), {} simulations -> {:.0f} sims/s, x{:.2f}".format(n, os.cpu_count(), simulations, rate, rate / base))
+
+
+def bench_batch_rollout(seconds=5.0, positions=4, batches=(16, 64, 256), seed=0):
+    """
+    Random rollouts per second from midgame positions: one game at a time through
+    update_board, against K games at a time with the NumPy engine (luv.rollout),
+    then SM_MCTS simulations per second with the leaves evaluated one by one or in batches.
+    """
+    boards = [midgame_board(s, plies=10) for s in range(positions)]
+    rng = random.Random(seed)
+    rollouts = plies = 0
+    begin = time.perf_counter()
+    while time.perf_counter() - begin < seconds:
+        plies += random_rollout(boards[rollouts % positions].copy(None), rng)
+        rollouts += 1
+    elapsed = time.perf_counter() - begin
+    base = rollouts / elapsed
+    print("batch rollout: one by one    {:.0f} rollouts/s, {:.0f} plies/s".format(base, plies / elapsed))
+    np_rng = np.random.default_rng(seed)
+    for k in batches:
+        rollouts = plies = 0
+        begin = time.perf_counter()
+        while time.perf_counter() - begin < seconds:
+            plies += batch_rollout([boards[i % positions] for i in range(k)], np_rng)[1].sum()
+            rollouts += k
+        elapsed = time.perf_counter() - begin
+        print("batch rollout: K = {:<4}     {:.0f} rollouts/s, {:.0f} plies/s, x{:.1f}".format(k, rollouts / elapsed, plies / elapsed, rollouts / elapsed / base))
+    for k in (1,) + tuple(batches[:2]):
+        simulations = 0
+        for board in boards:
+            mcts = SM_MCTS(board.copy(None), seconds / positions, 1, k)
+            mcts.actions()
+            simulations += mcts.simulations
+        print("batch rollout: SM_MCTS, leaves in batches of {:<4} {:.0f} sims/s".format(k, simulations / seconds))
+
+
+def self_play(make_upper, make_lower, board, turns):
+    """
+    Play a game from board, the players are built anew every turn by make_upper(board) and make_lower(board).
+    Return the result for upper: the utility if the game ended, otherwise the sign of material.
+    """
+    for _ in range(turns):
+        if board.goal_test():
+            return board.utility
+        upper_action = make_upper(board.copy(None)).actions()
+        lower_action = make_lower(board.copy(None)).actions()
+        board = board.update_board(upper_action, lower_action)
+        board.parent = None
+    if board.goal_test():
+        return board.utility
+    return int(np.sign(material(board)))
+
+
+def bench_decoupled(games=4, simulations=32, turns=40, rollout_batch=8, rules=(UCB, EXP3)):
+    """
+    Fixed budget self-play: decoupled SM_MCTS against the coupled SM_MCTS, both with the same
+    number of simulations per move. Games start from random early positions, sides alternate,
+    games still running after the given turns are decided on material.
+    """
+    def coupled(team):
+        def make(board):
+            board.team = team
+            mcts = SM_MCTS(board, np.inf, 1, rollout_batch)
+            mcts.max_simulations = simulations
+            return mcts
+        return make
+
+    def decoupled(team, rule):
+        def make(board):
+            board.team = team
+            mcts = Decoupled_SM_MCTS(board, np.inf, 1, rollout_batch, rule)
+            mcts.max_simulations = simulations
+            return mcts
+        return make
+
+    for rule in rules:
+        score = {WIN: 0, DRAW: 0, LOSE: 0}
+        begin = time.perf_counter()
+        for game in range(games):
+            board = midgame_board(game, plies=4)
+            if game % 2 == 0:
+                result = self_play(decoupled(Enums.Team.UPPER, rule), coupled(Enums.Team.LOWER), board, turns)
+            else:
+                result = -self_play(coupled(Enums.Team.UPPER), decoupled(Enums.Team.LOWER, rule), board, turns)
+            score[result] += 1
+        print("decoupled ({}) vs coupled SM_MCTS, {} simulations per move: {} wins, {} draws, {} losses in {:.0f}s".format(
+            rule, simulations, score[WIN], score[DRAW], score[LOSE], time.perf_counter() - begin))
+
+
+def bench_rollout_policy(seconds=3.0, positions=4):
+    """
+    SM_MCTS simulations per second and average rollout length for each rollout policy.
+    """
+    boards = [midgame_board(seed, plies=10) for seed in range(positions)]
+    policies = [
+        ("ranked (default)", RankedPolicy()),
+        ("uniform random", RandomPolicy()),
+        ("cutoff 40, random", CutoffPolicy(40)),
+        ("cutoff 10, random", CutoffPolicy(10)),
+        ("cutoff 10, ranked", CutoffPolicy(10, RankedPolicy())),
+    ]
+    for label, policy in policies:
+        simulations = plies = 0
+        for board in boards:
+            mcts = SM_MCTS(board.copy(None), seconds / positions)
+            mcts.policy = policy
+            mcts.actions()
+            simulations += mcts.simulations
+            plies += mcts.rollout_plies
+        print("rollout policy: {:<20} {:>6.0f} sims/s, {:.1f} plies per rollout".format(label, simulations / seconds, plies / max(simulations, 1)))
+
+
+def bench_arena(seconds=3.0, positions=3):
+    """
+    SM_MCTS with a Board per node against the arena node store: simulations per second,
+    and nodes per MB of memory allocated by the search (measured in a second, traced run).
+    Both use 10-ply cutoff rollouts so the trees grow quickly.
+    """
+    boards = [midgame_board(seed, plies=10) for seed in range(positions)]
+    for label, cls in (("Board nodes", SM_MCTS), ("arena nodes", Arena_SM_MCTS)):
+        simulations = 0
+        for board in boards:
+            mcts = cls(board.copy(None), seconds / positions)
+            mcts.policy = CutoffPolicy(10)
+            mcts.actions()
+            simulations += mcts.simulations
+        nodes = allocated = 0
+        for board in boards:
+            mcts = cls(board.copy(None), seconds / positions)
+            mcts.policy = CutoffPolicy(10)
+            tracemalloc.start()
+            mcts.actions()
+            allocated += tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            nodes += len(mcts.tree) if cls is Arena_SM_MCTS else len(mcts.visit)
+        print("arena: {:<12} {:>5.0f} sims/s, {} nodes, {:.0f} bytes/node, {:.0f} nodes/MB".format(
+            label, simulations / seconds, nodes, allocated / nodes, nodes / (allocated / 2 ** 20)))
+    print("arena: buffers hold {} bytes per node, {:.0f} nodes/MB once full".format(mcts.tree.node_bytes(), 2 ** 20 / mcts.tree.node_bytes()))
+
+
+def bench_memory_bound(seconds=4.0, max_nodes=200):
+    """
+    Tree size of each SM_MCTS kind with and without a node budget: nodes, approximate bytes,
+    bytes actually allocated by the search and simulations per second, then the number of
+    prunes and the nodes left by the last one. 5-ply cutoff rollouts.
+    """
+    board = midgame_board(0, plies=10)
+    for cls in (SM_MCTS, Decoupled_SM_MCTS, Arena_SM_MCTS):
+        for budget in (None, max_nodes):
+            mcts = cls(board.copy(None), seconds)
+            mcts.policy = CutoffPolicy(5)
+            mcts.max_nodes = budget
+            tracemalloc.start()
+            mcts.actions()
+            allocated = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print("memory bound: {:<18} budget {:<5} {:>6} nodes, ~{:>8} bytes, {:>8} bytes allocated, {:.0f} sims/s, {} prunes down to {} nodes".format(
+                cls.__name__, str(budget), mcts.node_count(), mcts.approximate_bytes(), allocated, mcts.simulation_rate,
+                mcts.prunes, mcts.pruned_to))
+
+
+def bench_transpositions(simulations=2000, capacities=(None, 1 << 16, 256)):
+    """
+    SM_MCTS from the opening (throws only) and from a midgame position without and
+    with a transposition table: nodes added per simulation, table hit rate and evictions,
+    simulations per second. 10-ply cutoff random rollouts, fixed number of simulations.
+    """
+    for name, board in (("opening", Board(Enums.Team.UPPER, None)), ("midgame", midgame_board(0, plies=10))):
+        for capacity in capacities:
+            random.seed(0)
+            mcts = SM_MCTS(board.copy(None), 1000)
+            mcts.max_simulations = simulations
+            mcts.policy = CutoffPolicy(10, RandomPolicy())
+            if capacity is not None:
+                mcts.transpositions = TranspositionTable(capacity)
+            mcts.actions()
+            table = mcts.transpositions
+            print("transpositions: {:<8} capacity {:<6} {:>5} nodes, {:.3f} nodes/sim, hit rate {:.3f}, {:>5} evictions, {:.0f} sims/s".format(
+                name, str(capacity), mcts.node_count(), mcts.nodes_per_simulation,
+                table.hit_rate() if table else 0, table.evictions if table else 0, mcts.simulation_rate))
+
+
+def bench_alphabeta(seeds=(0, 1, 2), seconds=(0.25, 1.0, 4.0), max_depth=10):
+    """
+    Iterative-deepening alpha-beta from midgame positions with a deadline per move:
+    depth of the deepest completed iteration (in turns, both sides moving) and nodes per second.
+    Then the nodes of all the iterations up to that depth without a deadline, against
+    a single search straight at that depth (no line, killers or history from previous iterations).
+    """
+    for seed in seeds:
+        board = midgame_board(seed)
+        for limit in seconds:
+            search = AlphaBeta_cutoff_MinMax(board.copy(None), max_depth, limit)
+            search.actions()
+            depth = search.depth_reached
+            deepening = AlphaBeta_cutoff_MinMax(board.copy(None), depth, None)
+            deepening.actions()
+            plain = AlphaBeta_cutoff_MinMax(board.copy(None), depth, None)
+            plain.search_root()
+            print("alphabeta: seed {} {:>4}s: depth {}, {:>6} nodes, {:.0f} nodes/s; to depth {}: {} nodes deepening, {} nodes in one search".format(
+                seed, limit, depth, search.nodes, search.node_rate, depth, deepening.nodes, plain.nodes))
+
+
+def bench_alphabeta_table(seeds=(0, 1, 2), depth=3, megabytes=(None, 1 / 64, 1, 16)):
+    """
+    Alpha-beta to a fixed depth without and with a transposition table of several sizes:
+    nodes, time, table hit rate (position found), cutoff rate (search of the position ended by the entry)
+    and replacements.
+    """
+    for seed in seeds:
+        board = midgame_board(seed)
+        for size in megabytes:
+            search = AlphaBeta_cutoff_MinMax(board.copy(None), depth, None)
+            if size is not None:
+                search.transpositions = AlphaBetaTable(size)
+            begin = time.perf_counter()
+            search.actions()
+            elapsed = time.perf_counter() - begin
+            table = search.transpositions
+            stats = ""
+            if table is not None:
+                stats = ", hits {:.3f}, cutoffs {:.3f}, {} replacements".format(
+                    table.hit_rate(), table.cutoffs / max(table.probes, 1), table.replacements)
+            print("alphabeta table: seed {} {:>9} MB: {:>6} nodes in {:.2f}s{}".format(
+                seed, "none" if size is None else round(size, 4), search.nodes, elapsed, stats))
+
+
+def full_matrix_value(search, board):
+    """
+    Equilibrium value of board with every cell of every payoff matrix searched,
+    with the leaves and solver of the SMAB search. Return (value, cells searched).
+    """
+    value = search.leaf_value(board)
+    if value is not None:
+        return value, 0
+    upper_actions = board.getActionCodes(Enums.Team.UPPER, search.action_limit)
+    lower_actions = board.getActionCodes(Enums.Team.LOWER, search.action_limit)
+    payoff = np.zeros((len(upper_actions), len(lower_actions)))
+    cells = payoff.size
+    for a, upper_action in enumerate(upper_actions):
+        for b, lower_action in enumerate(lower_actions):
+            board.apply(upper_action, lower_action)
+            payoff[a, b], child_cells = full_matrix_value(search, board)
+            cells += child_cells
+            board.undo()
+    return search.solve(payoff)[2], cells
+
+
+def bench_smab(seeds=range(6), plies=8, settings=((2, 8), (3, 5))):
+    """
+    SMAB against searching the full payoff matrices to the same depth, from positions of the
+    opening and early midgame: equilibrium value of both, cells searched and time.
+    """
+    for depth, action_limit in settings:
+        for seed in seeds:
+            board = midgame_board(seed, plies)
+            search = SMAB(board.copy(None), depth, action_limit)
+            begin = time.perf_counter()
+            value = search.search(search.board, -np.inf, np.inf)[0]
+            smab_time = time.perf_counter() - begin
+            full = SMAB(board.copy(None), depth, action_limit)
+            begin = time.perf_counter()
+            full_value, full_cells = full_matrix_value(full, full.board)
+            full_time = time.perf_counter() - begin
+            print("smab: depth {} {:>2} actions seed {}: value {:+.4f} (full {:+.4f}), {:>5} of {:>5} cells, {:.2f}s (full {:.2f}s)".format(
+                depth, action_limit, seed, value, full_value, search.cells, full_cells, smab_time, full_time))
+
+
+def exploitability(V, x, y):
+    """
+    How much the best replies to the strategies x (rows, maximiser) and y gain over them.
+    """
+    return (V @ y).max() - (x @ V).min()
+
+
+def bench_matrix_solver(sizes=(3, 5, 15, 30, 60), games=20, seeds=range(10), action_limit=15):
+    """
+    luv.matrixgame against the linear program of luv.gametheory on random games (normal payoffs,
+    half of them rounded to integers for ties and saddle points) and on the payoff matrices of
+    Equilibrium_payoff from midgame positions: worst value error (share of the payoff range),
+    worst exploitability of the strategies found, and the time per game of both.
+    Then regret matching alone, from uniform strategies and warm-started from a nearby solution.
+    """
+    rng = np.random.default_rng(0)
+    sets = []
+    for n in sizes:
+        matrices = [rng.normal(size=(n, n + k % 3)) for k in range(games)]
+        sets.append(("random {}x{}".format(n, n), [np.round(V) if k % 2 else V for k, V in enumerate(matrices)]))
+    real = []
+    for seed in seeds:
+        board = midgame_board(seed)
+        strategy = Equilibrium_payoff(board)
+        upper_actions = board.getActionCodes(Enums.Team.UPPER, action_limit)
+        lower_actions = board.getActionCodes(Enums.Team.LOWER, action_limit)
+        real.append(np.array(strategy.compute_payoff_matrix(board, upper_actions, lower_actions), dtype=float))
+    sets.append(("Equilibrium_payoff", real))
+    for name, matrices in sets:
+        error = worst = fast = slow = 0
+        for V in matrices:
+            scale = max(V.max() - V.min(), 1e-12)
+            begin = time.perf_counter()
+            x, y, value, gap = equilibrium(V)
+            fast += time.perf_counter() - begin
+            begin = time.perf_counter()
+            lp_value = solve_game_lp(V, True, True)[1]
+            solve_game_lp(V, False, False)
+            slow += time.perf_counter() - begin
+            error = max(error, abs(value - lp_value) / scale)
+            worst = max(worst, exploitability(V, x, y) / scale)
+        print("matrix solver: {:<20} error {:.1e}, exploitability {:.1e}, {:.3f} ms (linprog, both sides {:.3f} ms)".format(
+            name, error, worst, fast / len(matrices) * 1e3, slow / len(matrices) * 1e3))
+    V = rng.normal(size=(15, 15))
+    x, y, value, gap = equilibrium(V)
+    noise = rng.uniform(size=(2, 15)) * 0.1
+    warm = ((x + noise[0]) / (x + noise[0]).sum(), (y + noise[1]) / (y + noise[1]).sum())
+    for label, warm_start in (("uniform", None), ("warm", warm)):
+        begin = time.perf_counter()
+        xr, yr, value_rm, gap = regret_matching(V, *(warm_start or (None, None)))
+        print("matrix solver: regret matching from {:<7} 15x15: error {:.1e}, gap {:.1e}, {:.3f} ms".format(
+            label, abs(value_rm - value) / (V.max() - V.min()), gap, (time.perf_counter() - begin) * 1e3))
+
+
+def board_payoff_matrix(board, upper_actions, lower_actions):
+    """
+    The payoff matrix of Equilibrium_payoff built with a Board per joint action, as it used to be.
+    """
+    return np.array([[board.update_board(upper_action, lower_action).evaluation_score()
+        for lower_action in lower_actions] for upper_action in upper_actions])
+
+
+def legal_codes(team, limit, rng):
+    """
+    Up to limit distinct legal moves and throws of a team, drawn at random.
+    """
+    codes = list(dict.fromkeys(team.getMoveCodes() + team.getThrowCodes()))
+    return rng.sample(codes, min(limit, len(codes)))
+
+
+def bench_payoff_matrix(limits=(15, 30, 60), seeds=range(10), plies=(4, 12, 20), repeat=3):
+    """
+    Payoff matrix of Equilibrium_payoff from positions of the opening and midgame, at several
+    action limits, with the ranked actions of getActionCodes (usually fewer than the limit) and
+    with legal moves drawn at random up to the limit: entries different from the Board per joint
+    action construction, and the time per matrix of both.
+    """
+    rng = random.Random(0)
+    for actions in ("ranked", "legal"):
+        for limit in limits:
+            mismatches = cells = 0
+            vectorised = boards = 0
+            for seed in seeds:
+                for n in plies:
+                    board = midgame_board(seed, n)
+                    if actions == "ranked":
+                        upper_actions = board.getActionCodes(Enums.Team.UPPER, limit)
+                        lower_actions = board.getActionCodes(Enums.Team.LOWER, limit)
+                    else:
+                        upper_actions = legal_codes(board.uppers, limit, rng)
+                        lower_actions = legal_codes(board.lowers, limit, rng)
+                    strategy = Equilibrium_payoff(board)
+                    begin = time.perf_counter()
+                    for _ in range(repeat):
+                        fast = strategy.compute_payoff_matrix(board, upper_actions, lower_actions)
+                    vectorised += (time.perf_counter() - begin) / repeat
+                    begin = time.perf_counter()
+                    slow = board_payoff_matrix(board, upper_actions, lower_actions)
+                    boards += time.perf_counter() - begin
+                    mismatches += int(np.count_nonzero(fast != slow))
+                    cells += slow.size
+            count = len(seeds) * len(plies)
+            print("payoff matrix: {} limit {:>2}: {} of {:>6} entries differ, {:.2f} ms per matrix (boards {:.2f} ms)".format(
+                actions, limit, mismatches, cells, vectorised / count * 1e3, boards / count * 1e3))
+
+
+def bench_evaluation(batch_sizes=(1, 16, 256, 4096), seeds=range(10), plies=(4, 12, 20, 40), seconds=1.0):
+    """
+    Positions per second of the static evaluations: Board.evaluation_score and
+    AlphaBeta_cutoff_MinMax.evaluation one board at a time, and the batch evaluations of
+    luv.evaluation (on arrays already encoded, and with encode_boards), with the largest
+    difference between the two.
+    """
+    pool = [midgame_board(seed, n) for seed in seeds for n in plies]
+    alphabeta = AlphaBeta_cutoff_MinMax(pool[0], 1)
+    for name, single, scores in (("distance", Board.evaluation_score, distance_scores),
+            ("material", alphabeta.evaluation, material_scores)):
+        expected = np.array([single(board) for board in pool])
+        counts, throws, depth = encode_boards(pool)
+        error = np.abs(scores(counts, throws) - expected).max()
+        evaluated = 0
+        begin = time.perf_counter()
+        while time.perf_counter() - begin < seconds:
+            for board in pool:
+                single(board)
+            evaluated += len(pool)
+        rate = evaluated / (time.perf_counter() - begin)
+        print("evaluation: {} one board at a time: {:>9.0f} positions/s, largest difference of the batch {:.1e}".format(name, rate, error))
+        for size in batch_sizes:
+            boards = [pool[k % len(pool)] for k in range(size)]
+            counts, throws, depth = encode_boards(boards)
+            rates = []
+            for encode in (False, True):
+                evaluated = 0
+                begin = time.perf_counter()
+                while time.perf_counter() - begin < seconds:
+                    if encode:
+                        counts, throws, depth = encode_boards(boards)
+                    scores(counts, throws)
+                    evaluated += size
+                rates.append(evaluated / (time.perf_counter() - begin))
+            print("evaluation: {} batch of {:>4}: {:>10.0f} positions/s ({:>9.0f} with encode_boards)".format(name, size, *rates))
+
+
+def bench_incremental_evaluation(seeds=range(10), plies=(4, 12, 20, 40), actions=8, repeat=10):
+    """
+    Leaves of a search: every joint action of the best ranked actions is applied, scored and undone
+    on the same board, reading the evaluations from the incrementally updated terms (make and undo
+    keep them up to date) and computing them from scratch (no terms to keep up to date).
+    Best time per leaf, and the leaves where both differ.
+    """
+    pool = [midgame_board(seed, n) for seed in seeds for n in plies]
+    alphabeta = AlphaBeta_cutoff_MinMax(pool[0], 1)
+    leaves = [(board, [(a, b) for a in board.getActionCodes(Enums.Team.UPPER, actions)
+        for b in board.getActionCodes(Enums.Team.LOWER, actions)]) for board in pool]
+    count = sum(len(joint) for board, joint in leaves)
+    for name, incremental, full in (("distance", Board.evaluation_score, Board.full_evaluation_score),
+            ("material", alphabeta.evaluation, alphabeta.full_evaluation)):
+        mismatches = 0
+        for board, joint in leaves:
+            board.evaluation_terms()
+            for a, b in joint:
+                board.apply(a, b)
+                mismatches += incremental(board) != full(board)
+                board.undo()
+        # best of several rounds, the modes take turns
+        times = [float("inf")] * 3
+        for _ in range(repeat):
+            for mode, (score, terms) in enumerate(((incremental, True), (full, False), (None, False))):
+                for board, joint in leaves:
+                    board.terms = None
+                    if terms:
+                        board.evaluation_terms()
+                begin = time.perf_counter()
+                for board, joint in leaves:
+                    for a, b in joint:
+                        board.apply(a, b)
+                        if score is not None:
+                            score(board)
+                        board.undo()
+                times[mode] = min(times[mode], (time.perf_counter() - begin) / count * 1e6)
+        print("incremental evaluation: {}: {:.1f} us per leaf incremental, {:.1f} us from scratch (apply and undo alone {:.1f} us), {} of {} leaves differ".format(
+            name, times[0], times[1], times[2], mismatches, count))
+
+
+def bench_action_scoring(seeds=range(20), plies=(2, 6, 12, 20, 40), action_limit=15, repeat=20):
+    """
+    Time of Board.getActionCodes (move filtering, sort_actions and limit_throw) for both sides,
+    by the number of tokens of the opponent.
+    """
+    times = defaultdict(list)
+    for seed in seeds:
+        for n in plies:
+            board = midgame_board(seed, n)
+            for side, opponent in ((Enums.Team.UPPER, board.lowers), (Enums.Team.LOWER, board.uppers)):
+                begin = time.perf_counter()
+                for _ in range(repeat):
+                    board.getActionCodes(side, action_limit)
+                times[len(opponent.team)].append((time.perf_counter() - begin) / repeat)
+    for tokens in sorted(times):
+        print("action scoring: {} opponent tokens: {:>6.1f} us per call ({} positions)".format(
+            tokens, np.mean(times[tokens]) * 1e6, len(times[tokens])))
+
+
+def bench_threat_maps(seeds=range(20), plies=(6, 12, 20, 30, 40), repeat=200):
+    """
+    Threatened tokens found by the old escape rule (an enemy at distance 1) and by the threat maps
+    (an enemy slide or swing reaches the token), the escape moves that end on a hex an enemy
+    can still reach, and the time to build the threat maps of a position.
+    """
+    from luv import fields
+    adjacent = reached = escapes = unsafe = positions = 0
+    build = 0
+    for seed in seeds:
+        for n in plies:
+            board = midgame_board(seed, n)
+            positions += 1
+            for team, opponent in ((board.uppers, board.lowers), (board.lowers, board.uppers)):
+                threats = opponent.threats()
+                for token in team.team:
+                    t = TYPE_INDEX[token.tokenType]
+                    i = token.position.index
+                    enemy = opponent.bits.masks[BEATEN_BY[t]]
+                    adjacent += bool(NEIGHBOUR_MASK[i] & enemy)
+                    reached += threats[BEATEN_BY[t]] >> i & 1
+                for code in team.getMoveCodes():
+                    t = code >> 12 & 3
+                    enemy = opponent.bits.masks[BEATEN_BY[t]]
+                    if NEIGHBOUR_MASK[code >> 6 & 63] & enemy:
+                        escapes += 1
+                        unsafe += (threats[BEATEN_BY[t]] | enemy) >> (code & 63) & 1
+                begin = time.perf_counter()
+                for _ in range(repeat):
+                    fields._THREATS.clear()
+                    opponent.threats()
+                build += (time.perf_counter() - begin) / repeat
+    print("threat maps: {} positions: {} tokens with an enemy at distance 1, {} reached by an enemy slide or swing".format(
+        positions, adjacent, reached))
+    print("threat maps: {} of the {} escape moves of the distance 1 rule end where an enemy can take the token".format(unsafe, escapes))
+    print("threat maps: {:.1f} us to build the threat maps of a side".format(build / (2 * positions) * 1e6))
+
+
+def shuffle_moves(turn):
+    """
+    Joint action of a turn of a game that never ends: both sides throw one rock,
+    then slide it back and forth along their back row.
+    """
+    if turn == 0:
+        return ("THROW", "r", (4, -4)), ("THROW", "r", (-4, 4))
+    if turn % 2:
+        return ("SLIDE", (4, -4), (4, -3)), ("SLIDE", (-4, 4), (-4, 3))
+    return ("SLIDE", (4, -3), (4, -4)), ("SLIDE", (-4, 3), (-4, 4))
+
+
+def bench_turn_setup(turns=(10, 100, 300), repeat=200):
+    """
+    Per turn setup of the player (Player.update and the copy of the board handed to
+    the search) along a long game, against deep copying a board linked to all the
+    previous positions of the game, as the player used to.
+    """
+    player = Player("upper")
+    linked = Board(Enums.Team.UPPER, None)
+    turn = 0
+    for target in turns:
+        while turn < target:
+            upper_action, lower_action = shuffle_moves(turn)
+            player.update(lower_action, upper_action)
+            linked = linked.update_board(upper_action, lower_action)
+            turn += 1
+        upper_action, lower_action = shuffle_moves(turn)
+
+        begin = time.perf_counter()
+        for _ in range(repeat):
+            board = player.board
+            mcts = SM_MCTS(board.copy(None), 0)
+            mcts.history = player.history.position_counts()
+            board.update_board(upper_action, lower_action).parent = None
+        setup = (time.perf_counter() - begin) / repeat
+
+        begin = time.perf_counter()
+        for _ in range(repeat // 10):
+            deepcopy(linked)
+        linked_copy = (time.perf_counter() - begin) / (repeat // 10)
+        print("turn setup: turn {:>3}: detached {:.0f} us, deepcopy of the linked board {:.0f} us".format(turn, setup * 1e6, linked_copy * 1e6))
+
+
+BENCHMARKS = {
+    "rollout": bench_rollout,
+    "rollout_inplace": bench_rollout_inplace,
+    "geometry": bench_geometry,
+    "board_memory": bench_board_memory,
+    "move_generation": bench_move_generation,
+    "parallel_mcts": bench_parallel_mcts,
+    "batch_rollout": bench_batch_rollout,
+    "decoupled": bench_decoupled,
+    "rollout_policy": bench_rollout_policy,
+    "arena": bench_arena,
+    "memory_bound": bench_memory_bound,
+    "turn_setup": bench_turn_setup,
+    "transpositions": bench_transpositions,
+    "alphabeta": bench_alphabeta,
+    "alphabeta_table": bench_alphabeta_table,
+    "smab": bench_smab,
+    "matrix_solver": bench_matrix_solver,
+    "payoff_matrix": bench_payoff_matrix,
+    "evaluation": bench_evaluation,
+    "incremental_evaluation": bench_incremental_evaluation,
+    "action_scoring": bench_action_scoring,
+    "threat_maps": bench_threat_maps,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -0,0 +1,104 @@
+"""
+Bitboard representation of the game state.
+Hexes use the 0..60 indexing of luv.geometry, so a set of hexes fits in one 64-bit mask.
+Each side keeps one mask per token type (R, P, S).
+"""
+import luv.Enums as Enums
+
+from luv.geometry import NUM_HEXES, NEIGHBOUR_MASK
+
+# token types are stored as 0, 1, 2 in the masks
+TOKEN_TYPES = [Enums.TokenType.R, Enums.TokenType.P, Enums.TokenType.S]
+TYPE_INDEX = {ttype: i for i, ttype in enumerate(TOKEN_TYPES)}
+R, P, S = 0, 1, 2
+# BEATS[t] is the type t defeats, BEATEN_BY[t] is the type that defeats t
+BEATS = [S, R, P]
+BEATEN_BY = [P, S, R]
+
+
+def bits(mask):
+	"""
+	Yield the hex index of every set bit in the mask, lowest first.
+	"""
+	while mask:
+		low = mask & -mask
+		yield low.bit_length() - 1
+		mask ^= low
+
+
+class Bitboard:
+	"""
+	Token placement of one side: a mask per token type plus a stack count
+	for every (type, hex), since tokens of the same type may share a hex.
+	"""
+	masks: list
+	counts: bytearray
+
+	def __init__(self):
+		self.masks = [0, 0, 0]
+		self.counts = bytearray(3 * NUM_HEXES)
+
+	def __eq__(self, other):
+		return self.masks == other.masks and self.counts == other.counts
+
+	def copy(self):
+		bits = Bitboard.__new__(Bitboard)
+		bits.masks = self.masks[:]
+		bits.counts = self.counts[:]
+		return bits
+
+	def occupied(self):
+		"""
+		Mask of all hexes holding at least one token of this side.
+		"""
+		return self.masks[R] | self.masks[P] | self.masks[S]
+
+	def place(self, t, i):
+		"""
+		Put a token of type t on hex i.
+		"""
+		self.counts[t * NUM_HEXES + i] += 1
+		self.masks[t] |= 1 << i
+
+	def lift(self, t, i):
+		"""
+		Take a token of type t off hex i.
+		"""
+		k = t * NUM_HEXES + i
+		self.counts[k] -= 1
+		if not self.counts[k]:
+			self.masks[t] &= ~(1 << i)
+
+	def has_invincible(self, opponent):
+		"""
+		Whether this side has a token type the opponent has no answer to on the board.
+		"""
+		for t in (R, P, S):
+			if self.masks[t] and not opponent.masks[BEATEN_BY[t]]:
+				return True
+		return False
+
+
+def collisions(uppers, lowers, risk):
+	"""
+	Resolve the collisions on the risk hexes for both sides at once.
+	Return the mask of defeated hexes for every token type: a type is defeated
+	wherever the type beating it shares the hex (so all three types kill each other).
+	"""
+	r = (uppers.masks[R] | lowers.masks[R]) & risk
+	p = (uppers.masks[P] | lowers.masks[P]) & risk
+	s = (uppers.masks[S] | lowers.masks[S]) & risk
+	return [r & p, p & s, s & r]
+
+
+def slide_swing_targets(i, allies):
+	"""
+	Slide and swing destinations of a token on hex i.
+	allies: occupancy mask of the token's team
+	Return (slide mask, swing mask), swings exclude the slides and hex i itself.
+	"""
+	slides = NEIGHBOUR_MASK[i]
+	swings = 0
+	for j in bits(slides & allies):
+		swings |= NEIGHBOUR_MASK[j]
+	return slides, swings & ~slides & ~(1 << i)
@@ -0,0 +1,211 @@
+"""
+Static evaluation of positions in batches, for every strategy.
+A batch of K positions is in the array form of luv.rollout (stack counts (K, 2, 3, 61)
+and remaining throws (K, 2)), the scores are for upper, one per position:
+distance_scores is Board.evaluation_score (average distance of the tokens of a side to
+their nearest target, upper minus lower), from the precomputed hex distance matrix,
+material_scores is the evaluation of AlphaBeta_cutoff_MinMax (tokens and throws left, upper minus lower).
+One call scores the whole batch, no Board or Token is looked at.
+
+EvaluationTerms keeps the terms of both evaluations of one Board up to date while the board
+is played on in place (Board.make and Board.undo), so reading its score doesn't go over all the tokens.
+"""
+import numpy as np
+
+from luv.geometry import DISTANCE, NUM_HEXES
+from luv.fields import distance_field, FAR
+from luv.bitboard import BEATS, BEATEN_BY, TYPE_INDEX, bits
+from luv.moves import THROW
+from luv.rollout import encode_boards, UPPER, LOWER
+
+_DISTANCE = np.array(DISTANCE, dtype=np.int8)
+_BEATS = np.array(BEATS)
+# weights of the token and throw differences in material_scores
+TOKEN_WEIGHT = 0.7
+THROW_WEIGHT = 0.3
+# check every score of EvaluationTerms against the evaluation from scratch (Board.full_evaluation_score)
+CHECK_INCREMENTAL = False
+# every (side, type) group of tokens, as the bit side * 3 + t
+ALL_GROUPS = (1 << 6) - 1
+GROUPS = [divmod(g, 3) for g in range(6)]
+# sums of nearest target distances by (hexes of a group without stacks, hexes of its targets), shared by all boards
+_GROUP_DISTANCES = {}
+GROUP_CACHE_SIZE = 1 << 16
+# TARGETED_BY[g]: bit of the group targeting the tokens of group g
+TARGETED_BY = [1 << ((1 - side) * 3 + BEATEN_BY[t]) for side, t in GROUPS]
+
+
+def nearest_target_distances(counts, side):
+	"""
+	Average distance of the tokens of a side to their nearest target in every position,
+	0 for a token without a target (and for a side without tokens), as in Board.evaluation_score.
+	"""
+	k = len(counts)
+	stacks = counts[:, side].reshape(k, -1)
+	tokens = stacks.sum(axis=1)
+	# occupied (type, hex) slots of every position, a side has at most 9 of them
+	games, slots = np.nonzero(stacks > 0)
+	t, hexes = slots // NUM_HEXES, slots % NUM_HEXES
+	targets = counts[games, 1 - side, _BEATS[t]] > 0
+	distances = _DISTANCE[hexes]
+	distances[~targets] = FAR
+	nearest = distances.min(axis=1)
+	nearest[nearest == FAR] = 0
+	total = np.bincount(games, weights=nearest * stacks[games, slots], minlength=k)
+	return np.divide(total, tokens, out=np.zeros(k), where=tokens > 0)
+
+
+def distance_scores(counts, throws):
+	"""
+	Board.evaluation_score of every position.
+	"""
+	return nearest_target_distances(counts, UPPER) - nearest_target_distances(counts, LOWER)
+
+
+def material_scores(counts, throws):
+	"""
+	AlphaBeta_cutoff_MinMax.evaluation of every position.
+	"""
+	tokens = counts.sum(axis=(2, 3), dtype=np.int64)
+	throws = throws.astype(np.int64)
+	return TOKEN_WEIGHT * (tokens[:, UPPER] - tokens[:, LOWER]) + THROW_WEIGHT * (throws[:, UPPER] - throws[:, LOWER])
+
+
+def evaluate_boards(boards, scores=distance_scores):
+	"""
+	Scores of a list of boards with one of the batch evaluations above.
+	"""
+	counts, throws, depth = encode_boards(boards)
+	return scores(counts, throws)
+
+
+class EvaluationTerms:
+	"""
+	Terms of the static evaluations of a board, per (side, token type) group g = side * 3 + t:
+	tokens[g], the tokens of the group, and distances[g], the sum over them of the distance to their
+	nearest target (0 for a token without target), so Board.evaluation_score and the material
+	evaluation are read from 6 numbers.
+	record takes the joint action played by make: the group of a moved token changes by the
+	distances of the hexes it left and reached. A group whose targets moved (or was hit by a
+	collision) is stale (a bit of stale), its distances are recomputed from the distance fields (luv.fields) the next
+	time the score is read, for that group only. undo puts back the state saved by apply.
+	"""
+	__slots__ = ("tokens", "distances", "stale")
+
+	def __init__(self, board=None):
+		self.tokens = [0] * 6
+		self.distances = [0] * 6
+		self.stale = ALL_GROUPS
+		if board is not None:
+			for side, team in enumerate((board.uppers, board.lowers)):
+				counts = team.bits.counts
+				for t in range(3):
+					self.tokens[side * 3 + t] = sum(counts[t * NUM_HEXES:(t + 1) * NUM_HEXES])
+
+	def copy(self):
+		terms = EvaluationTerms.__new__(EvaluationTerms)
+		terms.tokens = self.tokens[:]
+		terms.distances = self.distances[:]
+		terms.stale = self.stale
+		return terms
+
+	def state(self):
+		return self.tokens[:], self.distances[:], self.stale
+
+	def restore(self, state):
+		# a state is only restored once (Board.undo), its lists can be taken over
+		self.tokens, self.distances, self.stale = state
+
+	def record(self, board, upper_action, lower_action, killed):
+		"""
+		Account for the move codes played on board by make, after the board changed.
+		killed: the tokens destroyed by the collision, as Board.checkCollision returns them
+		"""
+		stale = self.stale
+		for side, action in ((0, upper_action), (1, lower_action)):
+			if action:
+				stale |= TARGETED_BY[side * 3 + (action >> 12 & 3)]
+		if killed[0] or killed[1]:
+			for side in (0, 1):
+				for index, token in killed[side]:
+					g = side * 3 + TYPE_INDEX[token.tokenType]
+					self.tokens[g] -= 1
+					stale |= 1 << g | TARGETED_BY[g]
+		self.stale = stale
+		for side, action, opponent in ((0, upper_action, board.lowers), (1, lower_action, board.uppers)):
+			if not action:
+				continue
+			t = action >> 12 & 3
+			g = side * 3 + t
+			if action >> 14 == THROW:
+				self.tokens[g] += 1
+			# the targets of a group still up to date didn't move, so the distances are the same before and after
+			if stale >> g & 1:
+				continue
+			targets = opponent.bits.masks[BEATS[t]]
+			if targets:
+				field = distance_field(targets)
+				self.distances[g] += field[action & 63]
+				if action >> 14 != THROW:
+					self.distances[g] -= field[action >> 6 & 63]
+
+	def refresh(self, board):
+		"""
+		Recompute the distances of the stale groups.
+		"""
+		if not self.stale:
+			return
+		teams = (board.uppers.bits, board.lowers.bits)
+		for g in bits(self.stale):
+			side, t = GROUPS[g]
+			own = teams[side]
+			mask = own.masks[t]
+			targets = teams[1 - side].masks[BEATS[t]]
+			if not (mask and targets):
+				self.distances[g] = 0
+				continue
+			# without stacks the sum only depends on the two masks, and the same ones come back often in a search
+			single = self.tokens[g] == mask.bit_count()
+			if single:
+				total = _GROUP_DISTANCES.get((mask, targets))
+				if total is not None:
+					self.distances[g] = total
+					continue
+			total = 0
+			counts = own.counts
+			offset = t * NUM_HEXES
+			field = distance_field(targets)
+			key = mask
+			while mask:
+				low = mask & -mask
+				i = low.bit_length() - 1
+				total += counts[offset + i] * field[i]
+				mask ^= low
+			if single:
+				if len(_GROUP_DISTANCES) >= GROUP_CACHE_SIZE:
+					_GROUP_DISTANCES.clear()
+				_GROUP_DISTANCES[key, targets] = total
+			self.distances[g] = total
+		self.stale = 0
+
+	def distance_score(self, board):
+		"""
+		Board.evaluation_score: average nearest target distance of upper minus that of lower.
+		"""
+		self.refresh(board)
+		tokens = self.tokens
+		distances = self.distances
+		upper_tokens = tokens[0] + tokens[1] + tokens[2]
+		lower_tokens = tokens[3] + tokens[4] + tokens[5]
+		upper = (distances[0] + distances[1] + distances[2]) / upper_tokens if upper_tokens else 0
+		lower = (distances[3] + distances[4] + distances[5]) / lower_tokens if lower_tokens else 0
+		return upper - lower
+
+	def material(self, board):
+		"""
+		AlphaBeta_cutoff_MinMax.evaluation: token (per type) and throw differences, upper minus lower.
+		"""
+		tokens = self.tokens
+		diff_token = (tokens[0] - tokens[3]) + (tokens[1] - tokens[4]) + (tokens[2] - tokens[5])
+		diff_throw = board.uppers.remaining_throws - board.lowers.remaining_throws
+		return TOKEN_WEIGHT * diff_token + THROW_WEIGHT * diff_throw
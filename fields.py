@@ -0,0 +1,69 @@
+"""
+Fields over the 61 hexes computed once per position and read by the action scoring
+(Team.getLimitedCodes, sort_actions, limit_throw).
+
+A distance field holds, for every hex, the distance to the nearest hex of a set, here the
+tokens of one type of one side: the distance from a move's destination to its nearest
+target is a list read whatever the number of tokens.
+A field only depends on the hexes of the set, so fields are kept by mask and shared by all
+positions with the same tokens of that type. The distance fields also give the distances of
+luv.evaluation.EvaluationTerms.
+
+Threat maps: for each token type of a side, the mask of the hexes its tokens reach in one
+slide or swing (swings go through the side's own adjacent tokens, so they reach distance 2).
+A token is threatened where the reach of the type beating it covers its hex. A threat map only
+depends on the masks of the side, it is kept by masks like the distance fields.
+Threat maps only rank actions (escapes in Team.getLimitedCodes), the evaluation has no threat term.
+"""
+import numpy as np
+
+from luv.geometry import DISTANCE, NUM_HEXES
+from luv.bitboard import bits, slide_swing_targets
+
+_DISTANCE = np.array(DISTANCE, dtype=np.int8)
+# distance of every hex when the set is empty, larger than any distance on the board (Team.MAX_DIS, luv.evaluation)
+FAR = 10
+# most fields kept, the cache is emptied when it is full
+CACHE_SIZE = 1 << 16
+_FIELDS = {}
+_THREATS = {}
+
+
+def distance_field(mask):
+	"""
+	Distance from every hex to the nearest hex of the mask (FAR for all if it is empty): list of 61.
+	"""
+	field = _FIELDS.get(mask)
+	if field is None:
+		if not mask:
+			field = [FAR] * NUM_HEXES
+		elif not mask & (mask - 1):
+			field = DISTANCE[mask.bit_length() - 1]
+		else:
+			field = _DISTANCE[:, list(bits(mask))].min(axis=1).tolist()
+		if len(_FIELDS) >= CACHE_SIZE:
+			_FIELDS.clear()
+		_FIELDS[mask] = field
+	return field
+
+
+def threat_map(masks):
+	"""
+	Hexes reached in one slide or swing by the tokens of each type of a side: (R, P, S) masks.
+	masks: the masks of the side's bitboard (Bitboard.masks)
+	"""
+	key = (masks[0], masks[1], masks[2])
+	threats = _THREATS.get(key)
+	if threats is None:
+		occupied = key[0] | key[1] | key[2]
+		reach = [0, 0, 0]
+		for i in bits(occupied):
+			slides, swings = slide_swing_targets(i, occupied)
+			for t in range(3):
+				if key[t] >> i & 1:
+					reach[t] |= slides | swings
+		threats = tuple(reach)
+		if len(_THREATS) >= CACHE_SIZE:
+			_THREATS.clear()
+		_THREATS[key] = threats
+	return threats
@@ -0,0 +1,62 @@
+"""
+Precomputed geometry of the 61 hex board.
+The hexes are indexed 0..60 row by row (r = -4 up to r = 4, q ascending),
+the same order as util.print_board. All tables are built once at import,
+so distance, neighbour, swing and throw zone queries are table reads.
+"""
+import luv.Enums as Enums
+
+BOARD_SIDE_LENGTH = 4
+INITIAL_THROW = 9
+# all posible moving directions for a token
+ALL_DIRECTIONS = [(0, -1), (-1, 0), (-1, 1), (0, 1), (1, 0), (1, -1)]
+
+_RAN = range(-BOARD_SIDE_LENGTH, BOARD_SIDE_LENGTH + 1)
+# hex index -> (r, q)
+HEXES = [(r, q) for r in _RAN for q in _RAN if -r - q in _RAN]
+# (r, q) -> hex index
+HEX_INDEX = {rq: i for i, rq in enumerate(HEXES)}
+NUM_HEXES = len(HEXES)
+# row (r) of every hex
+ROW = [r for (r, q) in HEXES]
+
+
+def hex_distance(a, b):
+	"""
+	Number of steps between two (r, q) points (manhattan distance on hexagonal grids)
+	https://stackoverflow.com/questions/5084801/manhattan-distance-between-tiles-in-a-hexagonal-grid/5085274#5085274
+	"""
+	dx = a[0] - b[0]
+	dy = a[1] - b[1]
+	if dx * dy > 0:
+		return abs(dx + dy)
+	return max(abs(dx), abs(dy))
+
+
+# DISTANCE[i][j]: steps between hex i and hex j
+DISTANCE = [[hex_distance(a, b) for b in HEXES] for a in HEXES]
+
+# STEP[i][d]: hex reached from hex i in direction ALL_DIRECTIONS[d], None if off the board
+STEP = [[HEX_INDEX.get((r + dr, q + dq)) for (dr, dq) in ALL_DIRECTIONS] for (r, q) in HEXES]
+
+# NEIGHBOURS[i]: on-board neighbours of hex i, in ALL_DIRECTIONS order
+NEIGHBOURS = [[j for j in steps if j is not None] for steps in STEP]
+NEIGHBOUR_MASK = [sum(1 << j for j in nbrs) for nbrs in NEIGHBOURS]
+
+# SWING_TARGETS[i][j]: hexes a token on hex i can swing to through an ally on the adjacent hex j,
+# in ALL_DIRECTIONS order around j, leaving out hex i and the hexes it can already slide to
+SWING_TARGETS = [{j: [k for k in NEIGHBOURS[j] if k != i and not NEIGHBOUR_MASK[i] >> k & 1] for j in NEIGHBOURS[i]}
+	for i in range(NUM_HEXES)]
+
+
+def _throw_zone(from_row, to_row):
+	return [i for i in range(NUM_HEXES) if from_row <= ROW[i] <= to_row]
+
+
+# THROW_ZONE[team][throws made]: hexes a team may throw onto, in row then column order.
+# Upper throws from the top row down, lower from the bottom row up, one more row per throw made.
+THROW_ZONE = {
+	Enums.Team.UPPER: [_throw_zone(BOARD_SIDE_LENGTH - used, BOARD_SIDE_LENGTH) for used in range(INITIAL_THROW + 1)],
+	Enums.Team.LOWER: [_throw_zone(-BOARD_SIDE_LENGTH, -BOARD_SIDE_LENGTH + used) for used in range(INITIAL_THROW + 1)],
+}
+THROW_ZONE_MASK = {team: [sum(1 << i for i in zone) for zone in zones] for team, zones in THROW_ZONE.items()}
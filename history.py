@@ -0,0 +1,48 @@
+"""
+History of the game actually played, kept apart from the boards:
+the Zobrist key of every position reached and the moves of every turn.
+Boards don't point back to the previous positions of the game, so setting up
+a search costs the same on turn 300 as on turn 1.
+"""
+from collections import defaultdict
+
+
+class GameHistory:
+	"""
+	keys[i]: key of the position after i turns (keys[0] is the start)
+	moves[i]: (upper move code, lower move code) played on turn i + 1
+	counts: how many times every position key was reached
+	"""
+	keys: list
+	moves: list
+
+	def __init__(self, board):
+		self.keys = []
+		self.moves = []
+		self.counts = defaultdict(int)
+		self.push(board)
+
+	def __len__(self):
+		return len(self.moves)
+
+	def push(self, board, upper_action=None, lower_action=None):
+		"""
+		Record the position reached and the moves that led to it.
+		"""
+		key = board.key()
+		self.keys.append(key)
+		self.counts[key] += 1
+		if upper_action is not None:
+			self.moves.append((upper_action, lower_action))
+
+	def repetitions(self, board):
+		"""
+		Number of times the position of board was reached in the game.
+		"""
+		return self.counts[board.key()]
+
+	def position_counts(self):
+		"""
+		A copy of the counts, in the form Strategy.history uses (keyed by board.key()).
+		"""
+		return defaultdict(int, self.counts)
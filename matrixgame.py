@@ -0,0 +1,251 @@
+"""
+Fast solver for the small zero-sum matrix games of the search (payoff matrices of
+at most a few dozen actions per side), without the setup cost of a linear program
+on every call. In order:
+1. a pure saddle point,
+2. the iterated removal of dominated rows and columns (the value doesn't change),
+3. the closed form of 2x2 games,
+4. for the other small games, the simplex method on a dense tableau: the game's linear program
+starts feasible at the origin and gives both strategies at once,
+5. for large games or if the simplex fails: regret matching+ with averaged strategies, from the
+warm start if one is given, until the exploitability is within the tolerance or the iteration/time budget is spent,
+6. on request only, the linear program of luv.gametheory when the iterations didn't converge.
+The matrices are payoffs of the row player, who maximises.
+source:
+1. Tammelin et al., Solving Large Imperfect Information Games Using CFR+ (2015), regret matching+
+2. https://en.wikipedia.org/wiki/Strategic_dominance
+3. https://en.wikipedia.org/wiki/Zero-sum_game#Solving (the linear program of a matrix game)
+"""
+import time
+import numpy as np
+
+# default accuracy, as a share of the range of the payoffs, and budget of the iterative method
+TOLERANCE = 1e-4
+MAX_ITERATIONS = 5000
+# games with more actions than this for a side are solved by regret matching
+SIMPLEX_ACTIONS = 80
+# iterations of regret matching a warm start counts for, more holds on to a poor warm start too long
+WARM_START_WEIGHT = 1
+PIVOT_EPSILON = 1e-12
+
+
+def saddle_point(V):
+	"""
+	(row, column) of a pure saddle point of V, None if there is none.
+	"""
+	row_min = V.min(axis=1)
+	col_max = V.max(axis=0)
+	i = int(row_min.argmax())
+	j = int(col_max.argmin())
+	if row_min[i] == col_max[j]:
+		return i, j
+	return None
+
+
+def dominance(V):
+	"""
+	Rows and columns (boolean masks) left after removing, again and again, the rows dominated
+	by another row and the columns dominated (for the minimiser) by another column.
+	Of equal rows (or columns) the first one is kept.
+	"""
+	rows = np.ones(V.shape[0], dtype=bool)
+	cols = np.ones(V.shape[1], dtype=bool)
+	changed = True
+	while changed:
+		changed = False
+		for M, keep, other in ((V, rows, cols), (-V.T, cols, rows)):
+			alive = np.flatnonzero(keep)
+			if len(alive) < 2:
+				continue
+			reduced = M[np.ix_(alive, np.flatnonzero(other))]
+			# at_least[i, a]: row i is at least as good as row a everywhere
+			at_least = np.all(reduced[:, None, :] >= reduced[None, :, :], axis=2)
+			better = at_least & (~at_least.T | np.tri(len(alive), k=-1, dtype=bool).T)
+			dominated = better.any(axis=0)
+			if dominated.any():
+				keep[alive[dominated]] = False
+				changed = True
+	return rows, cols
+
+
+def solve_2x2(V):
+	"""
+	Equilibrium (x, y, value) of a 2x2 game without a saddle point.
+	"""
+	(a, b), (c, d) = V
+	denominator = a - b - c + d
+	p = (d - c) / denominator
+	q = (d - b) / denominator
+	return np.array([p, 1 - p]), np.array([q, 1 - q]), (a * d - b * c) / denominator
+
+
+def simplex(V):
+	"""
+	Exact equilibrium (x, y, value) of V with the simplex method, None if it didn't end.
+	With the payoffs shifted to be at least 1, the minimiser's program is
+	max sum(y') subject to V y' <= 1, y' >= 0: y = y' / sum(y') and the value is 1 / sum(y').
+	The maximiser's strategy comes from the dual values, the objective row under the slack columns.
+	"""
+	n, m = V.shape
+	shift = 1 - V.min()
+	tableau = np.zeros((n + 1, m + n + 1))
+	tableau[:n, :m] = V + shift
+	tableau[:n, m:m + n] = np.eye(n)
+	tableau[:n, -1] = 1
+	tableau[n, :m] = -1
+	basis = np.arange(m, m + n)
+	for _ in range(10 * (n + m)):
+		col = int(tableau[n, :-1].argmin())
+		if tableau[n, col] >= -PIVOT_EPSILON:
+			break
+		column = tableau[:n, col]
+		ratios = np.full(n, np.inf)
+		positive = column > PIVOT_EPSILON
+		ratios[positive] = tableau[:n, -1][positive] / column[positive]
+		row = int(ratios.argmin())
+		tableau[row] /= tableau[row, col]
+		factors = tableau[:, col].copy()
+		factors[row] = 0
+		tableau -= np.outer(factors, tableau[row])
+		basis[row] = col
+	else:
+		return None
+	y = np.zeros(m)
+	in_basis = basis < m
+	# rounding can leave values just below 0
+	y[basis[in_basis]] = np.maximum(tableau[:n, -1][in_basis], 0)
+	x = np.maximum(tableau[n, m:m + n], 0)
+	total = y.sum()
+	if total <= 0 or x.sum() <= 0:
+		return None
+	return x / x.sum(), y / total, 1 / total - shift
+
+
+def regret_matching(V, x=None, y=None, tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS, deadline=None, warm_weight=WARM_START_WEIGHT):
+	"""
+	Regret matching+ with alternating updates and linearly weighted averages, from the strategies
+	x and y if given. Return the average strategies, the value and the exploitability gap
+	(the value is within gap of the equilibrium value).
+	warm_weight: iterations the given strategies count for, they are the first warm_weight iterations
+	of the averages and the regrets start in their proportions
+	"""
+	n, m = V.shape
+	start = 0 if x is None and y is None else warm_weight
+	x = np.full(n, 1 / n) if x is None else np.asarray(x, dtype=float)
+	y = np.full(m, 1 / m) if y is None else np.asarray(y, dtype=float)
+	scale = max(V.max() - V.min(), 1e-12)
+	# the regrets of one iteration are at most scale
+	row_regret = start * scale * x
+	col_regret = start * scale * y
+	# weights t + 1 of the iterations 1 to start
+	weight_sum = (start + 1) * (start + 2) // 2 - 1
+	x_sum = weight_sum * x
+	y_sum = weight_sum * y
+	gap = np.inf
+	for t in range(start + 1, start + max_iterations + 1):
+		row_payoff = V @ y
+		row_regret = np.maximum(row_regret + row_payoff - x @ row_payoff, 0)
+		total = row_regret.sum()
+		if total > 0:
+			x = row_regret / total
+		col_payoff = x @ V
+		col_regret = np.maximum(col_regret + col_payoff @ y - col_payoff, 0)
+		total = col_regret.sum()
+		if total > 0:
+			y = col_regret / total
+		x_sum += (t + 1) * x
+		y_sum += (t + 1) * y
+		weight_sum += t + 1
+		# checking the gap costs two products, do it every few iterations
+		if t % 10 == 0 or t == start + max_iterations:
+			x_average = x_sum / weight_sum
+			y_average = y_sum / weight_sum
+			upper = (V @ y_average).max()
+			lower = (x_average @ V).min()
+			gap = upper - lower
+			if gap <= tolerance * scale or (deadline is not None and time.perf_counter() > deadline):
+				break
+	x_average = x_sum / weight_sum
+	y_average = y_sum / weight_sum
+	upper = (V @ y_average).max()
+	lower = (x_average @ V).min()
+	return x_average, y_average, (upper + lower) / 2, upper - lower
+
+
+def solve_reduced(V, warm_start, tolerance, max_iterations, time_budget, linprog):
+	"""
+	Same as equilibrium, for a game without dominated rows or columns.
+	"""
+	saddle = saddle_point(V)
+	if saddle is not None:
+		x = np.zeros(V.shape[0])
+		y = np.zeros(V.shape[1])
+		x[saddle[0]] = 1
+		y[saddle[1]] = 1
+		return x, y, V[saddle], 0
+	if V.shape == (2, 2):
+		return (*solve_2x2(V), 0)
+	if max(V.shape) <= SIMPLEX_ACTIONS:
+		solution = simplex(V)
+		if solution is not None:
+			return (*solution, 0)
+	x0 = y0 = None
+	if warm_start is not None:
+		# a warm start without weight on the actions left is no help
+		x0, y0 = (s / s.sum() if s.sum() > 0 else None for s in warm_start)
+	deadline = None if time_budget is None else time.perf_counter() + time_budget
+	x, y, value, gap = regret_matching(V, x0, y0, tolerance, max_iterations, deadline)
+	if linprog and gap > tolerance * max(V.max() - V.min(), 1e-12):
+		from luv.gametheory import solve_game as solve_lp
+		x, value = solve_lp(V, True, True)
+		y = solve_lp(V, False, False)[0]
+		# the linear program may give tiny negative probabilities
+		x = np.clip(x, 0, None)
+		y = np.clip(y, 0, None)
+		return x / x.sum(), y / y.sum(), value, 0
+	return x, y, value, gap
+
+
+def equilibrium(V, warm_start=None, tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS, time_budget=None, linprog=False):
+	"""
+	Equilibrium of the zero-sum game V (row player maximises): (x, y, value, gap).
+	gap is 0 for the exact paths (saddle point, 2x2 closed form, simplex, linear program),
+	otherwise the exploitability of the strategies found by regret matching.
+	warm_start: (x, y) strategies over all the rows and columns of V to start regret matching from
+	(the exact paths come first, the warm start is for the games regret matching solves)
+	time_budget: seconds the iterative method may take
+	linprog: solve with the linear program of luv.gametheory if the iterations end above the tolerance
+	"""
+	V = np.asarray(V, dtype=float)
+	n, m = V.shape
+	x = np.zeros(n)
+	y = np.zeros(m)
+	saddle = saddle_point(V)
+	if saddle is not None:
+		x[saddle[0]] = 1
+		y[saddle[1]] = 1
+		return x, y, V[saddle], 0
+	rows, cols = dominance(V)
+	if warm_start is not None:
+		warm_start = tuple(np.asarray(s, dtype=float)[mask] for s, mask in zip(warm_start, (rows, cols)))
+	x_reduced, y_reduced, value, gap = solve_reduced(V[np.ix_(rows, cols)], warm_start, tolerance, max_iterations, time_budget, linprog)
+	x[rows] = x_reduced
+	y[cols] = y_reduced
+	return x, y, value, gap
+
+
+def solve_game(V, maximiser=True, rowplayer=True, **options):
+	"""
+	Same as luv.gametheory.solve_game (strategy of one player and the value of the game for them),
+	with equilibrium. options: the keyword arguments of equilibrium
+	"""
+	# turn the game around so that the player wanted plays the rows and maximises
+	V = np.asarray(V, dtype=float)
+	if not rowplayer:
+		V = V.T
+	if not maximiser:
+		V = -V
+	x, y, value, gap = equilibrium(V, **options)
+	if not maximiser:
+		value = -value
+	return x, value
@@ -0,0 +1,69 @@
+"""
+Compact move encoding used inside the engine and the search.
+A move is a 16 bit int:  kind (2 bits) | token type (2 bits) | from hex (6 bits) | to hex (6 bits).
+Hexes use the geometry index, token types the bitboard index (R, P, S = 0, 1, 2),
+and the from hex of a throw is 0. Kinds start at 1 so no move is encoded as 0.
+Action objects and the referee's tuples are only built at the boundaries.
+"""
+from luv.geometry import HEXES, NEIGHBOURS, NUM_HEXES, THROW_ZONE
+from luv.bitboard import TOKEN_TYPES, TYPE_INDEX
+import luv.Enums as Enums
+
+THROW = 1
+SLIDE = 2
+SWING = 3
+KIND_NAMES = {THROW: "THROW", SLIDE: "SLIDE", SWING: "SWING"}
+KINDS = {name: kind for kind, name in KIND_NAMES.items()}
+
+# order the throws are generated in for every hex (same as Team.TOKEN_TYPE)
+THROW_TYPE_ORDER = [TYPE_INDEX[Enums.TokenType.S], TYPE_INDEX[Enums.TokenType.R], TYPE_INDEX[Enums.TokenType.P]]
+
+
+def encode(kind, t, from_hex, to_hex):
+	return kind << 14 | t << 12 | from_hex << 6 | to_hex
+
+
+def kind(code):
+	return code >> 14
+
+
+def token_type(code):
+	return code >> 12 & 3
+
+
+def from_hex(code):
+	return code >> 6 & 63
+
+
+def to_hex(code):
+	return code & 63
+
+
+def joint_action(upper_code, lower_code):
+	"""
+	One int for a pair of simultaneous moves.
+	"""
+	return upper_code << 16 | lower_code
+
+
+def represent(code):
+	"""
+	Represent the move in the referee's tuple format.
+	"""
+	k = code >> 14
+	if k == THROW:
+		return ("THROW", TOKEN_TYPES[code >> 12 & 3].value, HEXES[code & 63])
+	return (KIND_NAMES[k], HEXES[code >> 6 & 63], HEXES[code & 63])
+
+
+def toString(code):
+	# for debugging purposes
+	return str(represent(code)) + " " + str(TOKEN_TYPES[code >> 12 & 3])
+
+
+# SLIDE_CODES[t][i]: slides of a token of type t on hex i, in ALL_DIRECTIONS order
+SLIDE_CODES = [[[encode(SLIDE, t, i, j) for j in NEIGHBOURS[i]] for i in range(NUM_HEXES)] for t in range(3)]
+
+# THROW_CODES[team][throws made]: all throws in the throw zone, hex by hex
+THROW_CODES = {team: [[encode(THROW, t, 0, i) for i in zone for t in THROW_TYPE_ORDER] for zone in zones]
+	for team, zones in THROW_ZONE.items()}
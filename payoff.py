@@ -0,0 +1,53 @@
+"""
+Payoff matrices of Equilibrium_payoff without building a Board per joint action.
+The position is encoded once as stack counts (luv.rollout.encode_boards), copied
+for every joint action, and the moves, collisions and evaluation_score of all the
+joint actions are array operations (scored by luv.evaluation), so entry (a, b) is the same as
+board.update_board(upper_actions[a], lower_actions[b]).evaluation_score().
+"""
+import numpy as np
+
+from luv.rollout import encode_boards, resolve, UPPER, LOWER
+from luv.evaluation import distance_scores
+import luv.moves as moves
+
+
+def play_codes(counts, throws, side, codes):
+	"""
+	Play one move code per position for a side, in place.
+	"""
+	games = np.arange(len(counts))
+	t = codes >> 12 & 3
+	to = codes & 63
+	thrown = codes >> 14 == moves.THROW
+	slid = ~thrown
+	counts[games[slid], side, t[slid], (codes >> 6 & 63)[slid]] -= 1
+	counts[games, side, t, to] += 1
+	throws[games[thrown], side] -= 1
+
+
+def joint_outcomes(board, upper_actions, lower_actions):
+	"""
+	Positions after every joint action, upper action major: (counts (n * m, 2, 3, 61), throws (n * m, 2)).
+	"""
+	counts, throws, depth = encode_boards([board])
+	n, m = len(upper_actions), len(lower_actions)
+	counts = np.repeat(counts, n * m, axis=0)
+	throws = np.repeat(throws, n * m, axis=0)
+	upper = np.repeat(np.asarray(upper_actions, dtype=np.int64), m)
+	lower = np.tile(np.asarray(lower_actions, dtype=np.int64), n)
+	play_codes(counts, throws, UPPER, upper)
+	play_codes(counts, throws, LOWER, lower)
+	# Board.make checks both destination hexes, a hex can only be resolved once
+	resolve(counts, upper & 63)
+	resolve(counts, lower & 63)
+	return counts, throws
+
+
+def payoff_matrix(board, upper_actions, lower_actions):
+	"""
+	evaluation_score of the board after every joint action: (n, m) array.
+	"""
+	counts, throws = joint_outcomes(board, upper_actions, lower_actions)
+	scores = distance_scores(counts, throws)
+	return scores.reshape(len(upper_actions), len(lower_actions))
@@ -2,7 +2,8 @@ import luv.Enums as Enums
 from luv.Board import Board
 from luv.Coordinate import Coordinate
 from luv.Strategy import *
-from copy import deepcopy
+from luv.moves import represent
+from luv.history import GameHistory
 import time
 import random
 # import json
@@ -13,6 +14,11 @@ import random
 TIME_LIMIT = 60
 MAX_TURNS = 360
 CONSTANT = 0.00000001
+# processes searching each move with SM_MCTS (root parallelisation), this one included,
+# more than 1 starts a pool of worker processes kept until the program exits
+WORKERS = 1
+# approximate memory the search tree may use, the least visited subtrees are pruned beyond it
+MAX_TREE_BYTES = 100 * 2 ** 20
 
 class Player:
     player: str
@@ -33,8 +39,12 @@ class Player:
         
         # initiate the strategy
         self.board = Board(self.team, None)
+        # positions and moves of the game so far, the boards don't keep their previous positions
+        self.history = GameHistory(self.board)
         self.computation_time = 0
         self.turns = 0
+        # the search tree is kept between turns, see update
+        self.mcts = None
         # self.record("luv/game_record.json", None, None)
 
     def action(self):
@@ -52,17 +62,24 @@ class Player:
 
         # keep track of the players total computation time
         prior_t = time.time()
-        newboard = deepcopy(self.board)
 
         if (self.computation_time == 0):
             # dont use monte carlo for the first move, just pick a move randomly
-            strategy = Random(newboard)
+            strategy = Random(self.board.copy(None))
 
         else:
             if (TIME_LIMIT - self.computation_time) / (MAX_TURNS - self.turns) <= MIN_CALC_TIME:
                 calculation_time = (TIME_LIMIT - self.computation_time) / (MAX_TURNS - self.turns)
             calculation_time = RATE * ((TIME_LIMIT - self.computation_time) / (MAX_TURNS - self.turns))
-            strategy = SM_MCTS(newboard, calculation_time)
+            if self.mcts is None:
+                self.mcts = SM_MCTS(self.board.copy(None), calculation_time, WORKERS)
+                self.mcts.max_bytes = MAX_TREE_BYTES
+            else:
+                # continue with the subtree of the last turn
+                self.mcts.calculation_time = calculation_time
+            strategy = self.mcts
+        # repetitions of the game so far count towards the draws found by the search
+        strategy.history = self.history.position_counts()
         #MAX_DEPTH = 2
         #strategy = AlphaBeta_cutoff_MinMax(newboard, MAX_DEPTH)
         #strategy = Equilibrium_payoff(newboard)
@@ -70,8 +87,8 @@ class Player:
         self.computation_time += (time.time() - prior_t + CONSTANT)
         print("Total time:", self.computation_time, "\nTurns:", self.turns, "\n");
 
-        # return the tuple representation of action
-        return action.represent()
+        # return the tuple representation of action, strategies work on move codes
+        return represent(action)
     
     def update(self, opponent_action, player_action):
         """
@@ -82,11 +99,22 @@ class Player:
         and player_action is this instance's latest chosen action.
         """
         # put your code here
+        prior_t = time.time()
         # update players_action and opponent_action
         if self.team == Enums.Team.UPPER:
-            self.board = self.board.update_board(player_action, opponent_action)
+            upper_action, lower_action = player_action, opponent_action
         else:
-            self.board = self.board.update_board(opponent_action, player_action)
+            upper_action, lower_action = opponent_action, player_action
+        upper_action = self.board.uppers.encode(upper_action)
+        lower_action = self.board.lowers.encode(lower_action)
+        # descend the search tree to the position actually reached, or start a new tree next turn
+        if self.mcts is not None and not self.mcts.advance(upper_action, lower_action):
+            self.mcts = None
+        # the new board is not linked to the previous one, the history keeps the game instead
+        self.board = self.board.update_board(upper_action, lower_action)
+        self.board.parent = None
+        self.history.push(self.board, upper_action, lower_action)
+        self.computation_time += time.time() - prior_t
         # self.record("luv/game_record.json", opponent_action, player_action)
 
     # def record(self, file_path, opponent_action, player_action):
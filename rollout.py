@@ -0,0 +1,344 @@
+"""
+Rollouts for SM_MCTS.
+The rollout policies play one game on a Board in place (apply/undo), the batch
+engine plays K random games at once with NumPy.
+A position is a stack count per (side, token type, hex) and the remaining throws
+per side, so the K games are arrays of shape (K, 2, 3, 61) and (K, 2).
+Move generation, random move choice, collisions and the end of game test
+(Board.goal_test) are array operations over all the games still running.
+"""
+import random
+from abc import ABC, abstractmethod
+import numpy as np
+
+from luv.geometry import DISTANCE, NUM_HEXES, NEIGHBOURS, STEP, THROW_ZONE_MASK, INITIAL_THROW
+from luv.bitboard import BEATEN_BY
+import luv.moves as moves
+import luv.Enums as Enums
+
+WIN = 1
+LOSE = -1
+DRAW = 0
+UPPER, LOWER = 0, 1
+# Board.goal_test ends the game as a draw at this depth
+MAX_DEPTH = 360
+# index of an always empty hex, stands for the neighbours off the board
+EMPTY = NUM_HEXES
+
+
+def _move_table():
+	"""
+	Every distinct move of a side: throws of each type on each hex, then slides
+	to each neighbour, then swings to each hex at distance 2.
+	Return (kind, type, from, to) arrays.
+	"""
+	table = []
+	for t in range(3):
+		for i in range(NUM_HEXES):
+			table.append((moves.THROW, t, 0, i))
+	for t in range(3):
+		for i in range(NUM_HEXES):
+			for j in NEIGHBOURS[i]:
+				table.append((moves.SLIDE, t, i, j))
+	for t in range(3):
+		for i in range(NUM_HEXES):
+			for k in range(NUM_HEXES):
+				if DISTANCE[i][k] == 2:
+					table.append((moves.SWING, t, i, k))
+	return tuple(np.array(table, dtype=np.int64).T)
+
+
+MOVE_KIND, MOVE_TYPE, MOVE_FROM, MOVE_TO = _move_table()
+NUM_MOVES = len(MOVE_KIND)
+MOVE_CODES = np.array([moves.encode(*m) for m in zip(MOVE_KIND.tolist(), MOVE_TYPE.tolist(), MOVE_FROM.tolist(), MOVE_TO.tolist())])
+_BEATEN_BY = np.array(BEATEN_BY)
+
+# a side has at most 9 tokens, so at most 9 occupied (type, hex) slots
+MAX_SLOTS = INITIAL_THROW
+# a token has at most 6 slides and 12 swings (the hexes at distance 2)
+SLOT_WIDTH = 18
+# NEIGHBOUR_HEXES[i][d]: STEP with the hexes off the board replaced by EMPTY
+NEIGHBOUR_HEXES = np.array([[EMPTY if j is None else j for j in steps] for steps in STEP])
+
+
+def _slot_tables():
+	"""
+	Moves of a token by column: the 6 slides in ALL_DIRECTIONS order, then the swings.
+	Return SLOT_MOVES (3 * 61, SLOT_WIDTH), the move index of every (type, hex) slot and column,
+	and SLOT_LEGAL (61, 64, SLOT_WIDTH), whether the column is a legal move of a token on the hex
+	for each pattern of allies around it (bit d set if there is an ally in direction d).
+	"""
+	lookup = {m: k for k, m in enumerate(zip(MOVE_KIND.tolist(), MOVE_TYPE.tolist(), MOVE_FROM.tolist(), MOVE_TO.tolist()))}
+	slot_moves = np.zeros((3 * NUM_HEXES, SLOT_WIDTH), dtype=np.int64)
+	slot_legal = np.zeros((NUM_HEXES, 64, SLOT_WIDTH), dtype=bool)
+	for i in range(NUM_HEXES):
+		targets = [(moves.SLIDE, j, []) if j is not None else None for j in STEP[i]]
+		for k in range(NUM_HEXES):
+			if DISTANCE[i][k] == 2:
+				targets.append((moves.SWING, k, [d for d, j in enumerate(STEP[i]) if j is not None and DISTANCE[j][k] == 1]))
+		for column, target in enumerate(targets):
+			if target is None:
+				continue
+			kind, k, via = target
+			for t in range(3):
+				slot_moves[t * NUM_HEXES + i, column] = lookup[(kind, t, i, k)]
+			for pattern in range(64):
+				slot_legal[i, pattern, column] = kind == moves.SLIDE or any(pattern >> d & 1 for d in via)
+	return slot_moves, slot_legal
+
+
+SLOT_MOVES, SLOT_LEGAL = _slot_tables()
+_DIRECTION_BITS = 1 << np.arange(6)
+
+
+def _throw_table(team):
+	"""
+	Throws of a side by throws made, padded: (move index (10, 3 * 61), number of throws (10,)).
+	"""
+	index = np.zeros((INITIAL_THROW + 1, 3 * NUM_HEXES), dtype=np.int64)
+	size = np.zeros(INITIAL_THROW + 1, dtype=np.int64)
+	for used, mask in enumerate(THROW_ZONE_MASK[team]):
+		throws = [t * NUM_HEXES + i for t in range(3) for i in range(NUM_HEXES) if mask >> i & 1]
+		index[used, :len(throws)] = throws
+		size[used] = len(throws)
+	return index, size
+
+
+# THROW_MOVES[side][throws made]: throw move indices (the throws come first in the move table)
+THROW_MOVES, THROW_COUNT = zip(*[_throw_table(team) for team in (Enums.Team.UPPER, Enums.Team.LOWER)])
+
+
+def material(board):
+	"""
+	Fast static evaluation for upper: tokens on the board plus throws left, upper minus lower.
+	"""
+	upper = len(board.uppers.team) + board.uppers.remaining_throws
+	lower = len(board.lowers.team) + board.lowers.remaining_throws
+	return upper - lower
+
+
+def random_code(team):
+	"""
+	A random legal move of the team, drawn from the generated moves and throws without scoring them.
+	Stacked tokens generate their moves once per token.
+	"""
+	codes = team.getMoveCodes()
+	throws = moves.THROW_CODES[team.teamtype][INITIAL_THROW - team.remaining_throws] if team.remaining_throws else ()
+	k = random.randrange(len(codes) + len(throws))
+	if k < len(codes):
+		return codes[k]
+	return throws[k - len(codes)]
+
+
+class RolloutPolicy(ABC):
+	"""
+	How SM_MCTS plays out a leaf: joint_action picks the moves of both sides,
+	and the rollout is played on the board in place and taken back afterwards.
+	"""
+	@abstractmethod
+	def joint_action(self, board):
+		"""
+		(upper move code, lower move code) to play on board.
+		"""
+
+	def rollout(self, board, goal_test):
+		"""
+		Play the rollout until the end of the game.
+		goal_test: the strategy's goal test, which also knows the repeated positions
+		Return (utility for upper, plies played).
+		"""
+		plies = 0
+		while not goal_test(board):
+			board.apply(*self.joint_action(board))
+			plies += 1
+		result = board.utility
+		for _ in range(plies):
+			board.undo()
+		return result, plies
+
+
+class RankedPolicy(RolloutPolicy):
+	"""
+	Both sides take their best ranked actions (Board.getActionCodes), paired up
+	in rank order, and one pair is picked at random.
+	"""
+	def __init__(self, actions=5):
+		self.actions = actions
+
+	def joint_action(self, board):
+		lower_actions = board.getActionCodes(Enums.Team.LOWER, self.actions)
+		upper_actions = board.getActionCodes(Enums.Team.UPPER, self.actions)
+		comb = list(zip(upper_actions, lower_actions))
+		return comb[random.randint(0, len(comb) - 1)]
+
+
+class RandomPolicy(RolloutPolicy):
+	"""
+	Both sides play a uniformly random legal move, nothing is scored or sorted.
+	"""
+	def joint_action(self, board):
+		return random_code(board.uppers), random_code(board.lowers)
+
+
+class CutoffPolicy(RolloutPolicy):
+	"""
+	Play at most a number of plies with another policy, then score the position
+	with a static evaluation: WIN, DRAW or LOSE for upper by its sign.
+	"""
+	def __init__(self, plies=20, policy=None, evaluation=material):
+		self.plies = plies
+		self.policy = policy or RandomPolicy()
+		self.evaluation = evaluation
+
+	def joint_action(self, board):
+		return self.policy.joint_action(board)
+
+	def rollout(self, board, goal_test):
+		plies = 0
+		while plies < self.plies and not goal_test(board):
+			board.apply(*self.joint_action(board))
+			plies += 1
+		# the last ply may have ended the game
+		if plies < self.plies or goal_test(board):
+			result = board.utility
+		else:
+			score = self.evaluation(board)
+			result = WIN if score > 0 else LOSE if score < 0 else DRAW
+		for _ in range(plies):
+			board.undo()
+		return result, plies
+
+
+def encode_boards(boards):
+	"""
+	Array positions of the boards: (stack counts (K, 2, 3, 61), remaining throws (K, 2), depth (K,)).
+	"""
+	counts = np.empty((len(boards), 2, 3, NUM_HEXES), dtype=np.int8)
+	throws = np.empty((len(boards), 2), dtype=np.int8)
+	depth = np.empty(len(boards))
+	for k, board in enumerate(boards):
+		counts[k, UPPER] = np.frombuffer(board.uppers.bits.counts, dtype=np.int8).reshape(3, NUM_HEXES)
+		counts[k, LOWER] = np.frombuffer(board.lowers.bits.counts, dtype=np.int8).reshape(3, NUM_HEXES)
+		throws[k] = board.uppers.remaining_throws, board.lowers.remaining_throws
+		depth[k] = board.depth
+	return counts, throws, depth
+
+
+def token_moves(counts, side):
+	"""
+	Slides and swings of a side in every game, by occupied (type, hex) slot and column:
+	(slots (K, MAX_SLOTS), legal mask (K, MAX_SLOTS * SLOT_WIDTH)).
+	"""
+	n = len(counts)
+	occupied = counts[:, side].reshape(n, -1) > 0
+	allies = np.zeros((n, NUM_HEXES + 1), dtype=bool)
+	allies[:, :NUM_HEXES] = occupied.reshape(n, 3, NUM_HEXES).any(axis=1)
+	# list the occupied slots of every game, padded with empty slots
+	games, occupied_slots = np.nonzero(occupied)
+	first = np.searchsorted(games, np.arange(n))
+	column = np.arange(len(games)) - first[games]
+	slots = np.zeros((n, MAX_SLOTS), dtype=np.int64)
+	present = np.zeros((n, MAX_SLOTS), dtype=bool)
+	slots[games, column] = occupied_slots
+	present[games, column] = True
+	hexes = slots % NUM_HEXES
+	pattern = allies[np.arange(n)[:, None, None], NEIGHBOUR_HEXES[hexes]] @ _DIRECTION_BITS
+	legal = SLOT_LEGAL[hexes, pattern] & present[:, :, None]
+	return slots, legal.reshape(n, -1)
+
+
+def random_moves(counts, throws, side, rng):
+	"""
+	One uniformly random legal move per game for a side (index into the move table).
+	"""
+	n = len(counts)
+	used = INITIAL_THROW - throws[:, side]
+	throw_count = np.where(throws[:, side] > 0, THROW_COUNT[side][used], 0)
+	slots, legal = token_moves(counts, side)
+	total = throw_count + legal.sum(axis=1)
+	choice = (rng.random(n) * total).astype(np.int64)
+	# the choice-th legal move, counting the throws first
+	thrown = choice < throw_count
+	rank = choice - throw_count
+	column = (legal.cumsum(axis=1) > rank[:, None]).argmax(axis=1)
+	games = np.arange(n)
+	moved = SLOT_MOVES[slots[games, column // SLOT_WIDTH], column % SLOT_WIDTH]
+	return np.where(thrown, THROW_MOVES[side][used, np.minimum(choice, 3 * NUM_HEXES - 1)], moved)
+
+
+def play(counts, throws, side, move):
+	"""
+	Play one move per game for a side, in place.
+	"""
+	games = np.arange(len(counts))
+	t, to = MOVE_TYPE[move], MOVE_TO[move]
+	thrown = MOVE_KIND[move] == moves.THROW
+	slid = ~thrown
+	counts[games[slid], side, t[slid], MOVE_FROM[move][slid]] -= 1
+	counts[games, side, t, to] += 1
+	throws[games[thrown], side] -= 1
+
+
+def resolve(counts, hexes):
+	"""
+	Collisions on one hex per game: every token type beaten by a type present on the hex is removed, for both sides.
+	"""
+	games = np.arange(len(counts))
+	stacks = counts[games, :, :, hexes]
+	present = (stacks > 0).any(axis=1)
+	killed = present[:, _BEATEN_BY]
+	stacks[np.broadcast_to(killed[:, None, :], stacks.shape)] = 0
+	counts[games, :, :, hexes] = stacks
+
+
+def outcome(counts, throws, depth):
+	"""
+	Board.goal_test on every game: (finished (K,), utility for upper (K,)).
+	"""
+	tokens = counts.sum(axis=(2, 3))
+	present = counts.any(axis=3)
+	out = throws == 0
+	no_tokens = out & (tokens == 0)
+	one_token = out & (tokens == 1)
+	# a side has an invincible token if the opponent is out of throws and has no token of the type beating it
+	upper_inv = out[:, LOWER] & (present[:, UPPER] & ~present[:, LOWER][:, _BEATEN_BY]).any(axis=1)
+	lower_inv = out[:, UPPER] & (present[:, LOWER] & ~present[:, UPPER][:, _BEATEN_BY]).any(axis=1)
+	conditions = [
+		no_tokens[:, UPPER] & no_tokens[:, LOWER],
+		no_tokens[:, UPPER],
+		no_tokens[:, LOWER],
+		upper_inv & lower_inv,
+		upper_inv & one_token[:, LOWER],
+		lower_inv & one_token[:, UPPER],
+		depth >= MAX_DEPTH,
+	]
+	utility = np.select(conditions, [DRAW, LOSE, WIN, DRAW, WIN, LOSE, DRAW], DRAW)
+	return np.logical_or.reduce(conditions), utility
+
+
+def batch_rollout(boards, rng):
+	"""
+	Play uniformly random games from all the boards at once until they end.
+	Return (utility for upper (K,), plies played (K,)).
+	"""
+	counts, throws, depth = encode_boards(boards)
+	utility = np.zeros(len(boards), dtype=np.int64)
+	plies = np.zeros(len(boards), dtype=np.int64)
+	# index of the running games in the batch
+	running = np.arange(len(boards))
+	while True:
+		finished, result = outcome(counts, throws, depth)
+		if finished.any():
+			utility[running[finished]] = result[finished]
+			alive = ~finished
+			running, counts, throws, depth = running[alive], counts[alive], throws[alive], depth[alive]
+		if not len(running):
+			return utility, plies
+		upper_move = random_moves(counts, throws, UPPER, rng)
+		lower_move = random_moves(counts, throws, LOWER, rng)
+		play(counts, throws, UPPER, upper_move)
+		play(counts, throws, LOWER, lower_move)
+		resolve(counts, MOVE_TO[upper_move])
+		resolve(counts, MOVE_TO[lower_move])
+		depth += 1
+		plies[running] += 1
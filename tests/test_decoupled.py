@@ -0,0 +1,23 @@
+import random
+
+import pytest
+
+import luv.Enums as Enums
+from luv.Board import Board
+from luv.Strategy import Decoupled_SM_MCTS, EXP3
+
+
+def test_exp3_weights_use_the_probability_of_the_selection():
+    random.seed(0)
+    mcts = Decoupled_SM_MCTS(Board(Enums.Team.UPPER, None), 1, rule=EXP3)
+    root = mcts.board
+    leaves = [mcts.selection(root), mcts.selection(root)]
+    expected = [0.0] * len(mcts.stats[id(root)][0].actions)
+    for _ in range(3):
+        node, a, b, p, q = mcts.paths[0][0]
+        # a selection between the one of a path and its backpropagation changes the probabilities
+        leaves.append(mcts.selection(root))
+        # a win for upper: reward 1 for its action at the root
+        expected[a] += 1 / p
+        mcts.backpropagate(leaves.pop(0), 1)
+    assert mcts.stats[id(root)][0].weight == pytest.approx(expected)
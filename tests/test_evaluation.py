@@ -0,0 +1,49 @@
+import random
+
+import luv.evaluation as evaluation
+from luv.evaluation import evaluate_boards, distance_scores, material_scores
+from luv.benchmark import midgame_board
+from luv.rollout import random_code
+from luv.Strategy import AlphaBeta_cutoff_MinMax
+
+
+def random_joint_action(board):
+    return random_code(board.uppers), random_code(board.lowers)
+
+
+def test_incremental_evaluation_matches_the_full_one(monkeypatch):
+    # the scores also check themselves against the full evaluation
+    monkeypatch.setattr(evaluation, "CHECK_INCREMENTAL", True)
+    for seed in range(10):
+        random.seed(seed)
+        board = midgame_board(seed, plies=4)
+        alphabeta = AlphaBeta_cutoff_MinMax(board, 1)
+        board.evaluation_terms()
+        for _ in range(200):
+            step = random.random()
+            if board.undo_stack and (step < 0.3 or board.goal_test()):
+                board.undo()
+            elif board.goal_test():
+                break
+            elif step < 0.4:
+                # a new board copies the terms
+                board = board.update_board(*random_joint_action(board))
+            elif step < 0.5:
+                # one side only
+                board.apply(random_code(board.uppers), None)
+            else:
+                board.apply(*random_joint_action(board))
+            # scores read now and then, the groups whose targets moved stay stale in between
+            if random.random() < 0.5:
+                assert board.evaluation_score() == board.full_evaluation_score()
+                assert alphabeta.evaluation(board) == alphabeta.full_evaluation(board)
+
+
+def test_batch_scores_match_the_single_board_ones():
+    random.seed(0)
+    # opening to late midgame, and a child of each
+    boards = [midgame_board(seed, plies) for seed in range(10) for plies in (0, 4, 12, 20, 40)]
+    boards += [board.update_board(*random_joint_action(board)) for board in boards if not board.goal_test()]
+    alphabeta = AlphaBeta_cutoff_MinMax(boards[0], 1)
+    assert evaluate_boards(boards, distance_scores).tolist() == [board.full_evaluation_score() for board in boards]
+    assert evaluate_boards(boards, material_scores).tolist() == [alphabeta.evaluation(board) for board in boards]
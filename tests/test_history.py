@@ -0,0 +1,31 @@
+import luv.Enums as Enums
+from luv.Board import Board
+from luv.history import GameHistory
+from luv.Strategy import Random, DRAW
+
+
+def opening_board():
+    board = Board(Enums.Team.UPPER, None)
+    return board.update_board(("THROW", "r", (4, -2)), ("THROW", "s", (-4, 2)))
+
+
+def test_threefold_repetition_is_a_draw_for_the_search():
+    board = opening_board()
+    history = GameHistory(board)
+    history.push(board)
+    strategy = Random(board)
+    strategy.history = history.position_counts()
+    # reached twice in the game: not over yet
+    assert not strategy.goal_test(board)
+    history.push(board)
+    strategy.history = history.position_counts()
+    assert strategy.goal_test(board)
+    assert board.utility == DRAW
+
+
+def test_history_and_search_use_the_same_key():
+    board = opening_board()
+    history = GameHistory(board)
+    strategy = Random(board)
+    assert history.repetitions(board) == 1
+    assert history.position_counts()[board.key()] == strategy.history[board.key()] == 1
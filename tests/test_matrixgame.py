@@ -0,0 +1,24 @@
+import numpy as np
+
+from luv.matrixgame import equilibrium, regret_matching
+
+
+def random_game(seed=0, size=15):
+    return np.random.default_rng(seed).normal(size=(size, size))
+
+
+def test_regret_matching_starts_from_the_warm_start():
+    V = random_game()
+    x, y, value, gap = equilibrium(V)
+    # from the equilibrium, the first iterations keep to it
+    xr, yr, value_rm, gap_rm = regret_matching(V, x, y, max_iterations=1)
+    assert np.allclose(xr, x, atol=1e-6)
+    assert np.allclose(yr, y, atol=1e-6)
+    assert abs(value_rm - value) < 1e-6
+
+
+def test_warm_start_gives_the_exact_value_of_small_games():
+    V = random_game(1)
+    x, y, value, gap = equilibrium(V)
+    uniform = (np.ones(15), np.ones(15))
+    assert equilibrium(V, warm_start=uniform)[2:] == (value, 0)
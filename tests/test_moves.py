@@ -0,0 +1,15 @@
+import random
+
+from luv.benchmark import random_team, _reference_move_actions
+
+
+def action_signature(actions):
+    return [(action.atype, id(action.token), action.token.position.toTuple(), action.to_point.toTuple()) for action in actions]
+
+
+def test_move_generation_matches_the_original(positions=2000, seed=0):
+    # Team.getMoveActions against the original move generation on random positions, in the same order
+    rng = random.Random(seed)
+    for _ in range(positions):
+        team = random_team(rng, rng.randint(1, 9), radius=rng.randint(1, 4))
+        assert action_signature(team.getMoveActions()) == action_signature(_reference_move_actions(team))
@@ -0,0 +1,21 @@
+import random
+
+import numpy as np
+
+import luv.Enums as Enums
+from luv.benchmark import midgame_board, legal_codes, board_payoff_matrix
+from luv.Strategy import Equilibrium_payoff
+
+
+def test_payoff_matrix_matches_the_boards():
+    # ranked actions and legal moves drawn at random, which collide more often
+    rng = random.Random(0)
+    for seed in range(5):
+        for plies in (4, 12, 20):
+            board = midgame_board(seed, plies)
+            strategy = Equilibrium_payoff(board)
+            for upper_actions, lower_actions in (
+                    (board.getActionCodes(Enums.Team.UPPER, 15), board.getActionCodes(Enums.Team.LOWER, 15)),
+                    (legal_codes(board.uppers, 30, rng), legal_codes(board.lowers, 30, rng))):
+                matrix = strategy.compute_payoff_matrix(board, upper_actions, lower_actions)
+                assert np.array_equal(matrix, board_payoff_matrix(board, upper_actions, lower_actions))
@@ -0,0 +1,92 @@
+import random
+
+import numpy as np
+import pytest
+
+import luv.Enums as Enums
+from luv.Board import Board
+from luv.benchmark import midgame_board
+from luv.geometry import INITIAL_THROW
+from luv.rollout import (RolloutPolicy, CutoffPolicy, DRAW, UPPER, LOWER, MOVE_CODES, MOVE_TO, SLOT_MOVES, SLOT_WIDTH,
+    THROW_MOVES, THROW_COUNT, encode_boards, token_moves, play, resolve, outcome, random_code)
+
+
+def test_cutoff_scores_a_game_ended_by_the_last_ply():
+    board = Board(Enums.Team.UPPER, None)
+    # the next ply reaches the turn limit, a draw
+    board.depth = 359
+    policy = CutoffPolicy(1, evaluation=lambda board: 1)
+    result, plies = policy.rollout(board, Board.goal_test)
+    assert plies == 1
+    assert result == DRAW
+    assert board.depth == 359
+
+
+def test_rollout_policy_needs_joint_action():
+    with pytest.raises(TypeError):
+        RolloutPolicy()
+
+
+MOVE_INDEX = {code: k for k, code in enumerate(MOVE_CODES.tolist())}
+
+
+def random_games(seeds=range(10), plies=150):
+    # the positions of random games, from the opening and the midgame to their end
+    positions = []
+    for seed in seeds:
+        random.seed(seed)
+        board = midgame_board(seed, plies=seed % 3 * 8)
+        for _ in range(plies):
+            positions.append(board)
+            if board.goal_test():
+                break
+            board = board.update_board(random_code(board.uppers), random_code(board.lowers))
+    return positions
+
+
+def array_moves(board, side):
+    counts, throws, depth = encode_boards([board])
+    slots, legal = token_moves(counts, side)
+    columns = np.flatnonzero(legal[0])
+    codes = set(MOVE_CODES[SLOT_MOVES[slots[0, columns // SLOT_WIDTH], columns % SLOT_WIDTH]].tolist())
+    if throws[0, side]:
+        used = INITIAL_THROW - throws[0, side]
+        codes |= set(MOVE_CODES[THROW_MOVES[side][used, :THROW_COUNT[side][used]]].tolist())
+    return codes
+
+
+def test_array_moves_match_the_teams():
+    for board in random_games():
+        for side, team in ((UPPER, board.uppers), (LOWER, board.lowers)):
+            assert array_moves(board, side) == set(team.getMoveCodes()) | set(team.getThrowCodes())
+
+
+def test_array_collisions_match_the_board():
+    random.seed(0)
+    for board in random_games():
+        if board.goal_test():
+            continue
+        upper_action, lower_action = random_code(board.uppers), random_code(board.lowers)
+        counts, throws, depth = encode_boards([board])
+        upper_move = np.array([MOVE_INDEX[upper_action]])
+        lower_move = np.array([MOVE_INDEX[lower_action]])
+        play(counts, throws, UPPER, upper_move)
+        play(counts, throws, LOWER, lower_move)
+        resolve(counts, MOVE_TO[upper_move])
+        resolve(counts, MOVE_TO[lower_move])
+        expected_counts, expected_throws, expected_depth = encode_boards([board.update_board(upper_action, lower_action)])
+        assert np.array_equal(counts, expected_counts)
+        assert np.array_equal(throws, expected_throws)
+
+
+def test_array_outcome_matches_goal_test():
+    boards = random_games()
+    finished, utility = outcome(*encode_boards(boards))
+    ended = 0
+    for board, done, result in zip(boards, finished, utility):
+        assert done == board.goal_test()
+        if done:
+            ended += 1
+            assert result == board.utility
+    # the games were played to their end
+    assert ended
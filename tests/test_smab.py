@@ -0,0 +1,28 @@
+import numpy as np
+
+from luv.benchmark import midgame_board, full_matrix_value
+from luv.matrixgame import equilibrium
+from luv.Strategy import SMAB
+
+
+class InexactSMAB(SMAB):
+    # as an iterative solver would: the value is only known within the gap
+    def solve(self, matrix, warm_start=None):
+        x, y, value, gap = equilibrium(matrix)
+        return x, y, value - 0.01, 0.01
+
+
+def test_smab_matches_the_full_matrices():
+    for seed in range(3):
+        board = midgame_board(seed, plies=8)
+        search = SMAB(board.copy(None), 2, 5)
+        full = SMAB(board.copy(None), 2, 5)
+        assert np.isclose(search.search(search.board, -np.inf, np.inf)[0], full_matrix_value(full, full.board)[0])
+
+
+def test_smab_ends_with_an_inexact_solver():
+    for seed in range(3):
+        board = midgame_board(seed, plies=8)
+        search = InexactSMAB(board.copy(None), 2, 5)
+        value, upper_actions, lower_actions, x, y = search.search(search.board, -np.inf, np.inf)
+        assert search.cells <= search.total_cells
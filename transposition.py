@@ -0,0 +1,172 @@
+"""
+Transposition tables.
+
+TranspositionTable, for SM_MCTS: the node of every position in the tree, keyed by
+its Zobrist key (hash(board)), so a joint action reaching a position already in the
+tree through another order of moves links to the existing node instead of a new one.
+The tree becomes a DAG whose nodes share their visit and win counts.
+The table has a bounded number of entries, the least recently used one is evicted
+when it is full. An evicted node stays in the tree, it just can't be shared anymore.
+
+AlphaBetaTable, for the alpha-beta search: the result of the search of a position
+(bound and best move) at a given depth, in a fixed-size packed NumPy structured array.
+Entries are grouped in buckets of BUCKET_SIZE, a position can only be in the bucket
+picked by its key, and the entry searched the least deep is replaced first.
+"""
+from collections import OrderedDict
+import numpy as np
+
+# default number of positions in the table
+CAPACITY = 1 << 16
+
+# bound of an alpha-beta value: the exact value, at least the value (fail high), at most the value (fail low)
+EXACT, LOWER_BOUND, UPPER_BOUND = 1, 2, 3
+BUCKET_SIZE = 4
+# key 0 marks an empty entry
+ENTRY = np.dtype([("key", np.uint64), ("value", np.float32), ("move", np.uint16), ("depth", np.int8), ("bound", np.uint8)])
+
+
+class TranspositionTable:
+	"""
+	capacity: most positions kept
+	probes, hits, evictions: counts since the last reset_stats
+	"""
+	capacity: int
+
+	def __init__(self, capacity=CAPACITY):
+		self.capacity = capacity
+		self.table = OrderedDict()
+		self.reset_stats()
+
+	def __len__(self):
+		return len(self.table)
+
+	def reset_stats(self):
+		self.probes = 0
+		self.hits = 0
+		self.evictions = 0
+
+	def hit_rate(self):
+		return self.hits / self.probes if self.probes else 0
+
+	def lookup(self, board):
+		"""
+		The node already in the table in the same position as board, or board itself
+		after storing it if there is none.
+		"""
+		self.probes += 1
+		key = hash(board)
+		node = self.table.get(key)
+		# the whole position is compared, in case of a key collision
+		if node is not None and node == board:
+			self.hits += 1
+			self.table.move_to_end(key)
+			return node
+		self.table[key] = board
+		self.table.move_to_end(key)
+		if len(self.table) > self.capacity:
+			self.table.popitem(last=False)
+			self.evictions += 1
+		return board
+
+	def keep(self, nodes):
+		"""
+		Only keep the entries of the given nodes (the tree left after advance or prune).
+		"""
+		kept = {id(node) for node in nodes}
+		for key in [key for key, node in self.table.items() if id(node) not in kept]:
+			del self.table[key]
+
+
+class AlphaBetaTable:
+	"""
+	megabytes: memory of the entries (ENTRY.itemsize bytes each)
+	depth: plies searched under the position
+	move: best move code found (0 if none)
+	probes, hits, cutoffs, stores, replacements: counts since the last reset_stats
+	(hits find the position, cutoffs are hits whose bound ends the search of the position)
+	"""
+	buckets: int
+
+	def __init__(self, megabytes=16):
+		self.buckets = max(1, int(megabytes * 2 ** 20) // (ENTRY.itemsize * BUCKET_SIZE))
+		self.entries = np.zeros(self.buckets * BUCKET_SIZE, dtype=ENTRY)
+		# views on the columns, indexing them is much faster than indexing the records
+		self.keys = self.entries["key"]
+		self.values = self.entries["value"]
+		self.moves = self.entries["move"]
+		self.depths = self.entries["depth"]
+		self.bounds = self.entries["bound"]
+		self.reset_stats()
+
+	def __len__(self):
+		return int(np.count_nonzero(self.keys))
+
+	def nbytes(self):
+		return self.entries.nbytes
+
+	def reset_stats(self):
+		self.probes = 0
+		self.hits = 0
+		self.cutoffs = 0
+		self.stores = 0
+		self.replacements = 0
+
+	def hit_rate(self):
+		return self.hits / self.probes if self.probes else 0
+
+	def clear(self):
+		self.entries[:] = 0
+
+	def bucket(self, key):
+		start = (key % self.buckets) * BUCKET_SIZE
+		return start, self.keys[start:start + BUCKET_SIZE]
+
+	def probe(self, key, depth, alpha, beta):
+		"""
+		Look the position up. Return (value, move): value is not None if the entry
+		was searched at least depth plies and its bound settles the value within (alpha, beta),
+		move is the best move stored (0 if the position isn't in the table).
+		"""
+		self.probes += 1
+		start, keys = self.bucket(key)
+		found = np.flatnonzero(keys == np.uint64(key))
+		if not len(found):
+			return None, 0
+		self.hits += 1
+		i = start + int(found[0])
+		move = int(self.moves[i])
+		if self.depths[i] < depth:
+			return None, move
+		value = float(self.values[i])
+		bound = self.bounds[i]
+		if bound == EXACT or (bound == LOWER_BOUND and value >= beta) or (bound == UPPER_BOUND and value <= alpha):
+			self.cutoffs += 1
+			return value, move
+		return None, move
+
+	def store(self, key, depth, bound, value, move):
+		"""
+		Record the search of a position. Its own entry is overwritten if there is one,
+		otherwise an empty entry, otherwise the entry of the bucket searched the least deep.
+		"""
+		start, keys = self.bucket(key)
+		found = np.flatnonzero(keys == np.uint64(key))
+		if len(found):
+			i = start + int(found[0])
+			# keep a deeper search of the same position
+			if self.depths[i] > depth:
+				return
+		else:
+			empty = np.flatnonzero(keys == 0)
+			if len(empty):
+				i = start + int(empty[0])
+			else:
+				i = start + int(self.depths[start:start + BUCKET_SIZE].argmin())
+				self.replacements += 1
+		self.stores += 1
+		self.keys[i] = key
+		self.values[i] = value
+		self.moves[i] = move
+		self.depths[i] = min(depth, 127)
+		self.bounds[i] = bound
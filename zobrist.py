@@ -0,0 +1,35 @@
+"""
+Zobrist keys for hashing positions.
+A position key is the xor of one random key per (side, token type, hex, stack size),
+one per (side, remaining throws) and one for the side to move, so every change
+to the position updates the key with a couple of xors.
+"""
+import random
+from luv.bitboard import NUM_HEXES
+
+INITIAL_THROW = 9
+# at most 9 tokens of a side can share one hex
+MAX_STACK = 9
+UPPER, LOWER = 0, 1
+
+# fixed seed, keys have to be the same every game so they can be recorded
+_rng = random.Random(30024)
+
+# PIECES[side][(ttype * NUM_HEXES + hex) * (MAX_STACK + 1) + count], count 0 has key 0
+# so that an empty hex does not change the key
+PIECES = [[0 if count == 0 else _rng.getrandbits(64)
+		for _ in range(3 * NUM_HEXES) for count in range(MAX_STACK + 1)]
+	for side in (UPPER, LOWER)]
+
+# THROWS[side][remaining_throws]
+THROWS = [[_rng.getrandbits(64) for _ in range(INITIAL_THROW + 1)] for side in (UPPER, LOWER)]
+
+# xor-ed in between the two halves of a joint move, when only one side has moved (Board.result)
+HALF_MOVE = _rng.getrandbits(64)
+
+
+def piece(side, k, count):
+	"""
+	Key of count tokens of a side on stack slot k (ttype * NUM_HEXES + hex).
+	"""
+	return PIECES[side][k * (MAX_STACK + 1) + count]